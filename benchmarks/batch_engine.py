@@ -0,0 +1,106 @@
+from time import perf_counter
+import numpy as np
+import snake_custom
+import snake_batch
+from neural_network import SnakeBrain, PopulationNetwork, mutate_batch
+from benchmarks.collision import cycle_direction
+
+"""
+Comments:
+Regression benchmark of BatchSnakeGame against SnakeGame. The same brains play the same seeded games with
+SnakeBrain.play, one game at a time, and with PopulationNetwork.play, all at once, on several boards with and without
+loop detection. Every score, age and termination has to be exactly the same. The brains are mutated copies of the saved
+fittest_snake.brain, so that the games last long enough to eat fruits and go in circles.
+
+Evolved snakes don't fill the board, so both engines are also driven around a cycle through every tile of a few small
+boards, until every snake has won.
+
+Exits with an error on any difference. Run from the project root with: python -m benchmarks.batch_engine
+"""
+
+population_size = 300
+configs = [snake_custom.GameConfig(),
+           snake_custom.GameConfig(width=5, height=5, snake_spawn_length=3),
+           snake_custom.GameConfig(width=11, height=11, snake_spawn_direction=snake_custom.NORTH, max_steps=100),
+           snake_custom.GameConfig(width=12, height=12, snake_spawn_direction=snake_custom.WEST),
+           snake_custom.GameConfig(width=17, height=17)]
+# Have to be even for the cycle to cover the whole board
+cycle_sizes = [4, 6, 8]
+
+
+def compare_brains(network, config, detect_loops):
+    """
+    :return: Whether the scalar and batched scores, ages and terminations are the same, and the time each took
+    """
+    seeds = range(len(network))
+
+    start = perf_counter()
+    scalar = [brain.play(False, fruits=True, seed=seed, config=config, detect_loops=detect_loops)
+              for brain, seed in zip(network.to_brains(), seeds)]
+    scalar_time = perf_counter() - start
+
+    start = perf_counter()
+    score, age, termination = network.play(fruits=True, seeds=seeds, config=config, detect_loops=detect_loops)
+    batch_time = perf_counter() - start
+
+    same = (np.array_equal(score, [result[0] for result in scalar]) and
+            np.array_equal(age, [result[1] for result in scalar]) and
+            [snake_custom.terminations[t] for t in termination] == [result[2] for result in scalar])
+    return same, scalar_time, batch_time
+
+
+def compare_cycle(size, n_games=20):
+    """
+    Drive the snakes of both engines around the cycle of a size x size board until they all win
+    :return: Whether the scores, ages and terminations are the same, and the terminations
+    """
+    config = snake_custom.GameConfig(width=size, height=size, max_steps=size * size, snake_spawn_length=3,
+                                     snake_spawn_coord=(2, 0))
+    games = [snake_custom.SnakeGame(False, fruits=True, seed=seed, config=config) for seed in range(n_games)]
+    batch = snake_batch.BatchSnakeGame(n_games, fruits=True, seeds=range(n_games), config=config)
+    results = [None] * n_games
+
+    for i, game in enumerate(games):
+        while results[i] is None:
+            head = game.snake.pos[0]
+            result = game.step(cycle_direction(head % size, head // size, size))
+            if result:
+                results[i] = result[0], result[1], game.termination
+
+    while batch.alive.any():
+        heads = batch.body[np.arange(n_games), batch.head_index]
+        batch.step([cycle_direction(head % size, head // size, size) for head in heads])
+
+    batch_results = [(score, age, snake_custom.terminations[termination])
+                     for score, age, termination in zip(batch.score, batch.age, batch.termination)]
+    return results == batch_results, {result[2] for result in results}
+
+
+def main():
+    brain = SnakeBrain.load("fittest_snake.brain")
+    network = PopulationNetwork.from_brains([brain] * population_size)
+    mutate_batch(network, 0.05, scales=0.2, rng=np.random.default_rng(0))
+
+    mismatches = 0
+    print("Games per board: {}".format(population_size))
+    for detect_loops in (False, True):
+        for config in configs:
+            same, scalar_time, batch_time = compare_brains(network, config, detect_loops)
+            mismatches += not same
+            print("Board: {:>5}  ||  Detect loops: {!s:5}  ||  Scalar: {:.3f}s  ||  Batch: {:.3f}s  ||  {}".format(
+                "{}x{}".format(config.width, config.height), detect_loops, scalar_time, batch_time,
+                "same" if same else "MISMATCH"))
+
+    for size in cycle_sizes:
+        same, terminations = compare_cycle(size)
+        mismatches += not same
+        print("Cycle board: {:>5}  ||  Terminations: {}  ||  {}".format(
+            "{}x{}".format(size, size), ", ".join(sorted(terminations)), "same" if same else "MISMATCH"))
+
+    if mismatches:
+        raise SystemExit("The batched games differ from the scalar games on {} boards".format(mismatches))
+    print("Every batched game is the same as its scalar game")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+from time import perf_counter
+import snake_custom
+
+"""
+Comments:
+Microbenchmark of the steps per second of a single SnakeGame as the snake gets longer. The snake follows a cycle that
+covers the whole board, so that it can grow to almost the size of the board without ever dying, and the board is a lot
+larger than the default 9x9 to allow for long snakes.
+
+Run from the project root with: python -m benchmarks.collision
+"""
+
+# Has to be even for the cycle to cover the whole board
+board_size = 32
+lengths = [5, 50, 200, 500, 1000]
+steps_per_length = 20000
+
+# The snake spawns along the top row facing east, which is on the cycle, and has enough steps to never starve
+config = snake_custom.GameConfig(width=board_size, height=board_size, max_steps=2**62,
+                                 snake_spawn_coord=(snake_custom.snake_spawn_length - 1, 0))
+
+
+def cycle_direction(x, y, size):
+    """
+    The direction to move in on a cycle through every tile of the board: east along the top row, then snaking back and
+    forth over the rest of the columns, and finally north along the first column back to the top row.
+    :return: 0 : NORTH, 1 : EAST, 2 : SOUTH, 3 : WEST
+    """
+    if y == 0:
+        return 1 if x < size - 1 else 2
+    if x == 0:
+        return 0
+    if y % 2:
+        if x == 1:
+            return 3 if y == size - 1 else 2
+        return 3
+    return 2 if x == size - 1 else 1
+
+
+def steps_per_second(length):
+    """
+    Grow a snake to length by following the cycle, then time how fast it keeps moving along it
+    """
+    game = snake_custom.SnakeGame(False, fruits=False, seed=0, config=config)
+    for _ in range(length - config.snake_spawn_length):
+        game.snake.grow()
+
+    def step():
+        x, y = game.snake.pos[0] % board_size, game.snake.pos[0] // board_size
+        if game.step(cycle_direction(x, y, board_size)):
+            raise RuntimeError("The snake died on the cycle")
+
+    for _ in range(length):
+        step()
+
+    start = perf_counter()
+    for _ in range(steps_per_length):
+        step()
+    return steps_per_length / (perf_counter() - start)
+
+
+def main():
+    print("Board: {0}x{0}".format(board_size))
+    for length in lengths:
+        print("Length: {}  ||  Steps/s: {:.0f}".format(str(length).rjust(5), steps_per_second(length)))
+
+
+if __name__ == '__main__':
+    main()
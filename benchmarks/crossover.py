@@ -0,0 +1,82 @@
+from time import perf_counter
+import numpy as np
+from neural_network import SnakeBrain, PopulationNetwork, crossover_batch, layer_names
+
+"""
+Comments:
+Benchmark of how many children per second crossover makes, for single brains and for a whole generation at once, with
+and without preallocated buffers for the children. Before timing anything it checks that crossing over never changes
+the parents, since the same parents are crossed over many times in a generation.
+
+Run from the project root with: python -m benchmarks.crossover
+"""
+
+generation_size = 50000
+brain_pairs = 2000
+repeats = 5
+
+
+def check_parents_untouched():
+    rng = np.random.default_rng(0)
+    parent1, parent2 = SnakeBrain(rng=rng), SnakeBrain(rng=rng)
+    before = [getattr(brain, layer).copy() for brain in (parent1, parent2) for layer in layer_names]
+
+    for _ in range(10):
+        parent1.single_point_crossover(parent2, rng)
+        parent1.uniform_crossover(parent2, rng)
+
+    parents_a = PopulationNetwork.from_brains([parent1] * 10)
+    parents_b = PopulationNetwork.from_brains([parent2] * 10)
+    batch_before = [getattr(parents, layer).copy() for parents in (parents_a, parents_b) for layer in layer_names]
+    for uniform in (True, False):
+        crossover_batch(parents_a, parents_b, uniform, rng=rng)
+        crossover_batch(parents_a, parents_b, uniform, out=(PopulationNetwork.empty(10), PopulationNetwork.empty(10)),
+                        rng=rng)
+
+    after = [getattr(brain, layer) for brain in (parent1, parent2) for layer in layer_names]
+    batch_after = [getattr(parents, layer) for parents in (parents_a, parents_b) for layer in layer_names]
+    if not all(np.array_equal(b, a) for b, a in zip(before + batch_before, after + batch_after)):
+        raise SystemExit("Crossover changed the parents")
+    print("Parents are untouched by crossover")
+
+
+def children_per_second(crossover, children):
+    """
+    :param crossover: Function making the children
+    :param children: How many children one call makes
+    :return: The mean and standard deviation of children per second over the repeats
+    """
+    rates = []
+    for _ in range(repeats):
+        start = perf_counter()
+        crossover()
+        rates.append(children / (perf_counter() - start))
+    return np.mean(rates), np.std(rates)
+
+
+def main():
+    check_parents_untouched()
+
+    rng = np.random.default_rng(1)
+    brains1 = [SnakeBrain(rng=rng) for _ in range(brain_pairs)]
+    brains2 = [SnakeBrain(rng=rng) for _ in range(brain_pairs)]
+    parents_a = PopulationNetwork.from_brains([SnakeBrain(rng=rng) for _ in range(generation_size // 2)])
+    parents_b = PopulationNetwork.from_brains([SnakeBrain(rng=rng) for _ in range(generation_size // 2)])
+    buffers = (PopulationNetwork.empty(generation_size // 2), PopulationNetwork.empty(generation_size // 2))
+
+    for uniform in (True, False):
+        name = "Uniform" if uniform else "Single point"
+        cases = [
+            ("SnakeBrain", lambda: [(b1.uniform_crossover(b2, rng) if uniform else b1.single_point_crossover(b2, rng))
+                                    for b1, b2 in zip(brains1, brains2)], brain_pairs * 2),
+            ("Batch", lambda: crossover_batch(parents_a, parents_b, uniform, rng=rng), generation_size),
+            ("Batch, preallocated", lambda: crossover_batch(parents_a, parents_b, uniform, out=buffers, rng=rng),
+             generation_size)
+        ]
+        for case, crossover, children in cases:
+            mean, std = children_per_second(crossover, children)
+            print("{}  ||  {}  ||  Children/s: {:.0f} +- {:.0f}".format(name.ljust(12), case.ljust(19), mean, std))
+
+
+if __name__ == '__main__':
+    main()
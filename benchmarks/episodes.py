@@ -0,0 +1,55 @@
+from time import perf_counter
+import numpy as np
+import genetic_algorithm as ga
+from neural_network import SnakeBrain, mutate_batch
+
+"""
+Comments:
+Benchmark of how reliable the fitnesses of a population are for the time spent playing, with different numbers of games
+per snake. A population of mutated copies of the saved fittest_snake.brain is played once with a lot of games per snake,
+on games of their own, to get a reference of how fit every snake really is. Then every setting is timed, and scored on
+the mean reference fitness of the keep_per_gen snakes it would keep, compared to the best snakes it could have kept.
+
+Run from the project root with: python -m benchmarks.episodes
+"""
+
+population_size = 2000
+reference_episodes = 32
+# Episodes per snake, and whether they are played adaptively
+settings = [(1, False), (4, False), (8, False), (8, True), (16, True)]
+
+
+def evaluate(population, episodes, adaptive, seed_sequence):
+    """
+    :return: How long playing the games took, and the snakes that would be kept
+    """
+    ga.episodes_per_snake = episodes
+    ga.adaptive_episodes = adaptive
+    start = perf_counter()
+    population.calc_fitness(seed_sequence)
+    elapsed = perf_counter() - start
+    return elapsed, population.rank(ga.keep_per_gen)
+
+
+def main():
+    brain = SnakeBrain.load("fittest_snake.brain")
+
+    population = ga.Population(population_size, rng=np.random.default_rng(0))
+    population.store.genomes[:] = brain.genome()
+    mutate_batch(population.store.network, 0.05, scales=0.3, rng=np.random.default_rng(1))
+
+    _, best = evaluate(population, reference_episodes, False, np.random.SeedSequence(0))
+    reference = population.store.fitness.copy()
+    print("Population: {}  ||  Kept: {}  ||  Reference: {} games per snake  ||  Best kept reference fitness: {:.1f}"
+          .format(population_size, ga.keep_per_gen, reference_episodes, reference[best].mean()))
+
+    for episodes, adaptive in settings:
+        elapsed, kept = evaluate(population, episodes, adaptive, np.random.SeedSequence(1))
+        print("Episodes: {}  ||  Adaptive: {!s:5}  ||  Games per snake: {:5.2f}  ||  {:.2f}s  ||  "
+              "Kept reference fitness: {:.1f}".format(
+                str(episodes).rjust(2), adaptive, population.games_played / population_size, elapsed,
+                reference[kept].mean()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import subprocess
+import sys
+
+"""
+Comments:
+Startup benchmark for headless games: a cold python process imports the NN and plays its first 1,000 steps without
+graphics. This is run once as it is now, where pygame is never imported, and once with pygame imported up front like
+snake_custom used to do, to show what the lazy import saves every worker process.
+
+Run from the project root with: python -m benchmarks.headless_startup
+"""
+
+runs = 5
+
+cold_start = """
+from time import perf_counter
+start = perf_counter()
+{pre_import}
+import numpy as np
+from neural_network import SnakeBrain
+imported = perf_counter()
+
+rng = np.random.default_rng(0)
+steps = 0
+while steps < 1000:
+    brain = SnakeBrain(rng=rng)
+    brain.play(graphical=False, seed=steps)
+    steps += brain.game.age + 1
+played = perf_counter()
+
+import sys
+print(imported - start, played - imported, "pygame" in sys.modules)
+"""
+
+
+def time_cold_start(pre_import):
+    """
+    :param pre_import: Code to run before importing the NN
+    :return: The best import time and time of the first steps over all runs, and whether pygame was imported
+    """
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", cold_start.format(pre_import=pre_import)],
+                                capture_output=True, text=True, check=True).stdout.split()
+        results.append((float(output[-3]), float(output[-2]), output[-1] == "True"))
+
+    return min(r[0] for r in results), min(r[1] for r in results), results[0][2]
+
+
+def main():
+    for name, pre_import in [("With pygame (before)", "import pygame"), ("Headless (after)", "")]:
+        import_time, steps_time, pygame_imported = time_cold_start(pre_import)
+        print("{}  ||  Import: {:.3f}s  ||  First 1000 steps: {:.3f}s  ||  Total: {:.3f}s  ||  pygame loaded: {}"
+              .format(name.ljust(20), import_time, steps_time, import_time + steps_time, pygame_imported))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+from time import perf_counter
+import numpy as np
+import snake_custom
+from neural_network import SnakeBrain
+
+"""
+Comments:
+Regression benchmark for playing several games in one process. Every brain plays its game alone first, then all the
+games are played again interleaved, one step of each game at a time. Since every game owns its world, each interleaved
+game has to follow the exact same trajectory as when it was played alone.
+
+Run from the project root with: python -m benchmarks.interleaved_games
+"""
+
+n_games = 64
+
+
+def trajectory_step(game, brain):
+    """
+    Play one step of a game
+    :return: What the snake saw, the direction it chose, and the result of the step
+    """
+    vision = game.snake.look()
+    direction = int(np.argmax(brain.get_output(np.array(vision))))
+    return tuple(vision), direction, game.step(direction)
+
+
+def play_solo(brain, seed):
+    game = snake_custom.SnakeGame(False, seed=seed)
+    trajectory = []
+    while not trajectory or not trajectory[-1][2]:
+        trajectory.append(trajectory_step(game, brain))
+    return trajectory
+
+
+def play_interleaved(brains, seeds):
+    games = [snake_custom.SnakeGame(False, seed=seed) for seed in seeds]
+    trajectories = [[] for _ in games]
+    playing = list(range(len(games)))
+
+    while playing:
+        for i in list(playing):
+            trajectories[i].append(trajectory_step(games[i], brains[i]))
+            if trajectories[i][-1][2]:
+                playing.remove(i)
+
+    return trajectories
+
+
+def main():
+    rng = np.random.default_rng(0)
+    brains = [SnakeBrain(rng=rng) for _ in range(n_games)]
+    seeds = list(range(n_games))
+
+    start = perf_counter()
+    solo = [play_solo(brain, seed) for brain, seed in zip(brains, seeds)]
+    solo_time = perf_counter() - start
+
+    start = perf_counter()
+    interleaved = play_interleaved(brains, seeds)
+    interleaved_time = perf_counter() - start
+
+    steps = sum(len(t) for t in solo)
+    mismatches = [i for i in range(n_games) if solo[i] != interleaved[i]]
+
+    print("Games: {}  ||  Steps: {}".format(n_games, steps))
+    print("Solo:        {:.3f}s  ({:.0f} steps/s)".format(solo_time, steps / solo_time))
+    print("Interleaved: {:.3f}s  ({:.0f} steps/s)".format(interleaved_time, steps / interleaved_time))
+
+    if mismatches:
+        raise SystemExit("Interleaved games differ from solo games: {}".format(mismatches))
+    print("Every interleaved game matched its solo game")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+from time import perf_counter
+import numpy as np
+import snake_custom
+import snake_batch
+from neural_network import SnakeBrain, PopulationNetwork, mutate_batch
+
+"""
+Comments:
+Benchmark of how many steps are played per evaluation with and without loop detection, see snake_batch. Random brains
+die within a few steps, so the population is made of mutated copies of the saved fittest_snake.brain, which like most
+evolved snakes has learned to go in circles when it can't find a fruit. The scores and ages have to be the same with
+and without loop detection, only the steps that are played to get them should go down.
+
+Run from the project root with: python -m benchmarks.loop_detection
+"""
+
+population_size = 5000
+mutation_rate = 0.05
+mutation_scale = 0.2
+
+
+def evaluate(network, fruits, seeds, detect_loops):
+    """
+    PopulationNetwork.play, but counting how many steps are actually played
+    :return: Scores, ages, terminations and the number of steps played
+    """
+    game = snake_batch.BatchSnakeGame(len(network), fruits, seeds, detect_loops=detect_loops)
+    output = np.zeros(len(network), dtype=np.intp)
+    steps = 0
+
+    while game.alive.any():
+        alive = np.flatnonzero(game.alive)
+        steps += len(alive)
+        output[alive] = np.argmax(network[alive].get_output(game.look(alive)), axis=1)
+        game.step(output)
+
+    return game.score, game.age, game.termination, steps
+
+
+def main():
+    brain = SnakeBrain.load("fittest_snake.brain")
+
+    network = PopulationNetwork.from_brains([brain] * population_size)
+    mutate_batch(network, mutation_rate, scales=mutation_scale, rng=np.random.default_rng(0))
+    seeds = list(range(population_size))
+
+    print("Evaluations: {}".format(population_size))
+    for fruits in (True, False):
+        results = {}
+        for detect_loops in (False, True):
+            start = perf_counter()
+            score, age, termination, steps = evaluate(network, fruits, seeds, detect_loops)
+            elapsed = perf_counter() - start
+            results[detect_loops] = score, age
+
+            counts = np.bincount(termination, minlength=len(snake_custom.terminations))
+            reasons = ", ".join("{}: {}".format(reason, count) for reason, count in
+                                zip(snake_custom.terminations[1:], counts[1:]))
+            print("Fruits: {!s:5}  ||  Detect loops: {!s:5}  ||  Steps per evaluation: {:7.1f}  ||  {:.3f}s  ||  {}"
+                  .format(fruits, detect_loops, steps / population_size, elapsed, reasons))
+
+        if not all(np.array_equal(a, b) for a, b in zip(results[False], results[True])):
+            raise SystemExit("Loop detection changed the scores or ages")
+
+    print("Scores and ages are the same with and without loop detection")
+
+
+if __name__ == '__main__':
+    main()
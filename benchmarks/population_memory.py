@@ -0,0 +1,49 @@
+import tracemalloc
+import numpy as np
+from neural_network import SnakeBrain
+from genetic_algorithm import PopulationStore
+
+"""
+Comments:
+Memory used per individual by a population, stored the old way as a list of [SnakeBrain, fitness] pairs, and stored
+in a PopulationStore. The old population is measured with tracemalloc, as most of its memory is in small objects.
+
+Run from the project root with: python -m benchmarks.population_memory
+"""
+
+population_size = 50000
+
+
+def list_of_brains(rng):
+    tracemalloc.start()
+    population = [[SnakeBrain(rng=rng), 0] for _ in range(population_size)]
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    del population
+    return used / population_size
+
+
+def population_store(rng):
+    tracemalloc.start()
+    store = PopulationStore(population_size)
+    store.randomize(rng=rng)
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return used / population_size, store.memory_per_individual()
+
+
+def main():
+    rng = np.random.default_rng(0)
+    before = list_of_brains(rng)
+    after, reported = population_store(rng)
+
+    print("Population size: {}".format(population_size))
+    print("List of [SnakeBrain, fitness] (before):  {:.0f} bytes per individual".format(before))
+    print("PopulationStore (after):                 {:.0f} bytes per individual ({:.0f} reported by the store)"
+          .format(after, reported))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+from contextlib import contextmanager, redirect_stdout
+from time import perf_counter, time
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import numpy as np
+import snake_custom
+import genetic_algorithm as ga
+from neural_network import SnakeBrain, PopulationNetwork, crossover_batch, mutate_batch, genome_length
+
+"""
+Comments:
+Benchmark suite of the hot paths of the game, the NN and the GA, from a single look() up to a whole generation of the GA
+at several population sizes. Every case is built from fixed seeds, so it does exactly the same work every run.
+
+Each case is a function doing some operations, called enough times per round for a round to take at least
+min_round_time, after one call to warm up. The operations per second of every round are reported as their mean and
+standard deviation over the rounds.
+
+The results can be written as JSON with --output, and compared to an earlier output with --baseline. A case is a
+regression when it's more than --tolerance slower than the baseline, by more than the noise of both runs. Any regression
+makes the exit code 1, so the suite can be run as a check. The numbers depend on the machine, so a baseline is only
+meaningful from the same machine, which is why none is stored in the repo.
+
+The whole generation cases play with the settings of genetic_algorithm, without saving any snakes or checkpoints.
+
+Run from the project root with: python -m benchmarks.suite [--filter NAME] [--output FILE] [--baseline FILE]
+"""
+
+rounds = 5
+min_round_time = 0.2
+population_sizes = [500, 5000, 50000]
+# How many brains the batched NN cases work on at once
+batch_size = 5000
+tolerance = 0.1
+# How many standard deviations of the difference a change has to be, to be more than noise
+noise_deviations = 2.
+
+
+@contextmanager
+def module_settings(module, **settings):
+    """
+    Temporarily change the globals of a module
+    """
+    old = {name: getattr(module, name) for name in settings}
+    for name, value in settings.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in old.items():
+            setattr(module, name, value)
+
+
+# A snake of four parts spawned facing north, that the inputs take around the same 2x2 square forever. It never collides,
+# as the tail is always moved out of the way just before the head moves in, and doesn't starve within any benchmark
+square_config = snake_custom.GameConfig(snake_spawn_length=4, snake_spawn_direction=snake_custom.NORTH,
+                                        max_steps=2**62)
+square_inputs = [1, 2, 3, 0]
+
+
+# Every case is a function that sets it up, and returns a function to time and how many operations one call of it does
+
+
+def snake_look():
+    game = snake_custom.SnakeGame(False, fruits=True, seed=0)
+    return game.snake.look, 1
+
+
+def snake_move_collision():
+    snake = snake_custom.Snake(spawn_coord=square_config.snake_spawn_coord, spawn_length=4, spawn_dir=snake_custom.NORTH,
+                               draw_snake=False, config=square_config)
+    directions = [snake_custom.NORTH, snake_custom.EAST, snake_custom.SOUTH, snake_custom.WEST]
+    square = [directions[i] for i in square_inputs]
+
+    def move():
+        for direction in square:
+            snake.change_direction(direction)
+            snake.move()
+            if snake.has_collided(None) != 3:
+                raise RuntimeError("The snake collided on the square")
+
+    return move, len(square)
+
+
+def snake_game_step():
+    game = snake_custom.SnakeGame(False, fruits=False, seed=0, config=square_config)
+
+    def step():
+        for direction in square_inputs:
+            if game.step(direction):
+                raise RuntimeError("The snake died on the square")
+
+    return step, len(square_inputs)
+
+
+def fruit_spawn():
+    # A snake covering all but a few cells of a 32x32 board, spawning a fruit used to get slower the less room was left
+    config = snake_custom.GameConfig(width=32, height=32)
+    world = [1] * (config.width * config.height)
+    world[::64] = [0] * len(world[::64])
+    snake = snake_custom.Snake(spawn_coord=config.snake_spawn_coord, spawn_length=1, spawn_dir=snake_custom.EAST,
+                               draw_snake=False, world=world, config=config)
+    rng = np.random.default_rng(0)
+    return lambda: snake_custom.Fruit(snake, rng), 1
+
+
+def brain_get_output():
+    brain = SnakeBrain(rng=np.random.default_rng(0))
+    vision = np.array(snake_custom.SnakeGame(False, fruits=True, seed=0).snake.look())
+    return lambda: brain.get_output(vision), 1
+
+
+def network_get_output():
+    rng = np.random.default_rng(0)
+    network = PopulationNetwork.from_genomes(rng.uniform(-1, 1, (batch_size, genome_length())))
+    vision = rng.integers(0, 9, (batch_size, 24)).astype(float)
+    return lambda: network.get_output(vision), batch_size
+
+
+def brain_crossover(uniform):
+    def setup():
+        rng = np.random.default_rng(0)
+        brain1, brain2 = SnakeBrain(rng=rng), SnakeBrain(rng=rng)
+        crossover = brain1.uniform_crossover if uniform else brain1.single_point_crossover
+        return lambda: crossover(brain2, rng), 2
+    return setup
+
+
+def batch_crossover(uniform):
+    def setup():
+        rng = np.random.default_rng(0)
+        parents_a = PopulationNetwork.from_genomes(rng.uniform(-1, 1, (batch_size, genome_length())))
+        parents_b = PopulationNetwork.from_genomes(rng.uniform(-1, 1, (batch_size, genome_length())))
+        out = PopulationNetwork.empty(batch_size), PopulationNetwork.empty(batch_size)
+        return lambda: crossover_batch(parents_a, parents_b, uniform, out=out, rng=rng), batch_size * 2
+    return setup
+
+
+def brain_mutate():
+    rng = np.random.default_rng(0)
+    brain = SnakeBrain(rng=rng)
+    return lambda: brain.mutate(rng), 1
+
+
+def batch_mutate():
+    rng = np.random.default_rng(0)
+    network = PopulationNetwork.from_genomes(rng.uniform(-1, 1, (batch_size, genome_length())))
+    return lambda: mutate_batch(network, 0.05, rng=rng), batch_size
+
+
+def selection(size):
+    def setup():
+        rng = np.random.default_rng(0)
+        population = ga.Population(size, rng=rng)
+        # Fitnesses like the ones of real games, age * 2**score
+        population.store.fitness[:] = rng.integers(1, 300, size) * np.exp2(rng.geometric(0.5, size) - 1)
+        n = ga.parent_pairs_per_gen * 2
+        return lambda: population.fitness_based_selection(n, rng), n
+    return setup
+
+
+def generation(size):
+    def setup():
+        with module_settings(ga, seed=0), redirect_stdout(io.StringIO()):
+            algorithm = ga.GeneticAlgorithm()
+        store = ga.Population(size, rng=np.random.default_rng(0)).store
+
+        def run_generation():
+            # The same generation every call, and never a new top score, which would save the snake
+            algorithm.generation = 1
+            algorithm.top_score = float("inf")
+            algorithm.latest_highest_fitnesses = []
+            algorithm.pop = ga.Population(store=store)
+            with module_settings(ga, checkpoint_every=0), redirect_stdout(io.StringIO()):
+                algorithm.run_generation()
+
+        # Operations are the individuals of the generation, so the sizes can be compared
+        return run_generation, size
+    return setup
+
+
+cases = [("Snake.look", snake_look),
+         ("Snake.move + has_collided", snake_move_collision),
+         ("SnakeGame.step", snake_game_step),
+         ("Fruit, full board", fruit_spawn),
+         ("SnakeBrain.get_output", brain_get_output),
+         ("PopulationNetwork.get_output", network_get_output),
+         ("SnakeBrain.uniform_crossover", brain_crossover(True)),
+         ("SnakeBrain.single_point_crossover", brain_crossover(False)),
+         ("crossover_batch, uniform", batch_crossover(True)),
+         ("crossover_batch, single point", batch_crossover(False)),
+         ("SnakeBrain.mutate", brain_mutate),
+         ("mutate_batch", batch_mutate)]
+cases += [("fitness_based_selection, {}".format(size), selection(size)) for size in population_sizes]
+cases += [("Generation, {}".format(size), generation(size)) for size in population_sizes]
+
+
+def measure(setup):
+    """
+    :param setup: Function setting up a case, see cases
+    :return: The operations per second of every round
+    """
+    function, operations = setup()
+    start = perf_counter()
+    function()
+    # Enough calls for a round to take at least min_round_time, the warm up call gives a first guess of how many
+    calls = max(1, int(min_round_time / max(perf_counter() - start, 1e-9)))
+
+    rates = []
+    for _ in range(rounds):
+        start = perf_counter()
+        for _ in range(calls):
+            function()
+        rates.append(calls * operations / (perf_counter() - start))
+    return rates
+
+
+def environment():
+    """
+    :return: Dict of what the numbers depend on, besides the code
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {"timestamp": time(), "commit": commit or None, "python": platform.python_version(),
+            "numpy": np.__version__, "machine": platform.machine(), "processor": platform.processor(),
+            "platform": platform.platform()}
+
+
+def compare(results, baseline):
+    """
+    Print how every case changed from the baseline
+    :return: The names of the cases that regressed
+    """
+    regressions = []
+    print("\nCompared to the baseline from commit {}".format(baseline["environment"].get("commit")))
+    for name, result in results.items():
+        if name not in baseline["cases"]:
+            continue
+        old = baseline["cases"][name]
+        change = result["mean"] / old["mean"] - 1
+        noise = noise_deviations * np.hypot(result["std"], old["std"])
+        significant = abs(result["mean"] - old["mean"]) > noise
+        regressed = significant and change < -tolerance
+        if regressed:
+            regressions.append(name)
+        print("{}  ||  {:+7.1%}  ||  {}".format(name.ljust(34), change,
+                                               "REGRESSION" if regressed else "" if significant else "noise"))
+    return regressions
+
+
+def main():
+    global rounds, tolerance
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths of the game, the NN and the GA")
+    parser.add_argument("--filter", default="", help="Only run the cases with this in their name")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare to the results in this file, written by --output")
+    parser.add_argument("--rounds", type=int, default=rounds)
+    parser.add_argument("--tolerance", type=float, default=tolerance,
+                        help="How much slower than the baseline a case can be, {} by default".format(tolerance))
+    args = parser.parse_args()
+    rounds, tolerance = args.rounds, args.tolerance
+
+    results = {}
+    for name, setup in cases:
+        if args.filter.lower() not in name.lower():
+            continue
+        rates = measure(setup)
+        results[name] = {"mean": float(np.mean(rates)), "std": float(np.std(rates, ddof=1)) if rounds > 1 else 0.,
+                         "rounds": rates}
+        print("{}  ||  Ops/s: {:>14,.1f} +- {:5.1%}".format(name.ljust(34), results[name]["mean"],
+                                                         results[name]["std"] / results[name]["mean"]))
+        sys.stdout.flush()
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"environment": environment(), "rounds": rounds, "min_round_time": min_round_time,
+                       "cases": results}, file, indent=2)
+        print("Saved results to {}".format(os.path.abspath(args.output)))
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file))
+        if regressions:
+            raise SystemExit("Regressed: {}".format(", ".join(regressions)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+from dataclasses import asdict
+import json
+import os
+import numpy as np
+import snake_custom
+
+"""
+Comments:
+brain_file saves and loads the genomes of brains, see neural_network.split_genomes, without pickling the SnakeBrain
+objects. A pickle of a SnakeBrain needs the exact module and class it was made with to load, and holds whatever game
+the brain last played.
+
+A brain file is laid out as:
+    magic           8 bytes, b"SNAKENN\0"
+    header length   4 bytes, little endian unsigned int
+    header          JSON, padded with spaces so that the genomes start at a multiple of 64 bytes
+    genomes         Raw little endian float64, one row of genome length per brain
+
+The header holds the version of the format, the layer sizes and activation of the network, the number of brains, the
+snake_custom.GameConfig the brains were evolved in, and optionally a fitness per brain and anything else worth keeping.
+Since the genomes are just raw floats at a known offset they're loaded with np.memmap, so opening a file of thousands of
+brains only reads the ones that are used.
+
+Requirements: numpy
+"""
+
+magic = b"SNAKENN\0"
+version = 1
+# The genomes start at a multiple of this many bytes
+alignment = 64
+dtype = np.dtype("<f8")
+
+# The activation every layer of SnakeBrain uses, 1 / (1 + e^x)
+activation = "sigmoid"
+
+
+def save(path, genomes, fitness=None, game=None, sizes=(24, 8, 4), **metadata):
+    """
+    Save genomes to a brain file. The file is written next to path and then moved over it, so that a brain file is
+    never left half written.
+
+    :param path: Where to save the brains
+    :param genomes: Array of one genome per brain, or a single genome
+    :param fitness: Optional fitness of each brain, or of the single brain
+    :param game: snake_custom.GameConfig of the game the brains play, snake_custom.default_config() if not given
+    :param sizes: The input_size, nodes_per_layer and output_size of the brains
+    :param metadata: Anything else to keep in the header, has to be JSON serializable
+    """
+    genomes = np.ascontiguousarray(np.atleast_2d(genomes), dtype=dtype)
+
+    header = {"version": version,
+              "input_size": sizes[0], "nodes_per_layer": sizes[1], "output_size": sizes[2],
+              "activation": activation,
+              "dtype": dtype.str,
+              "shape": list(genomes.shape),
+              "fitness": None if fitness is None else np.atleast_1d(fitness).tolist(),
+              "game": asdict(snake_custom.default_config() if game is None else game),
+              "metadata": metadata}
+    encoded = json.dumps(header).encode()
+
+    # Pad the header with spaces, which JSON ignores, up to the alignment
+    offset = len(magic) + 4 + len(encoded)
+    encoded += b" " * (-offset % alignment)
+
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(magic)
+        file.write(len(encoded).to_bytes(4, "little"))
+        file.write(encoded)
+        file.write(genomes.tobytes())
+    os.replace(temporary_path, path)
+
+
+def read_header(path):
+    """
+    :param path: Path of a brain file
+    :return: The header of the file, and where its genomes start
+    """
+    with open(path, "rb") as file:
+        if file.read(len(magic)) != magic:
+            raise ValueError("{} is not a brain file".format(path))
+        length = int.from_bytes(file.read(4), "little")
+        header = json.loads(file.read(length).decode())
+
+    if header["version"] > version:
+        raise ValueError("{} is a version {} brain file, only up to version {} can be loaded"
+                         .format(path, header["version"], version))
+    if header["activation"] != activation:
+        raise ValueError("{} uses the activation {}, SnakeBrain uses {}".format(path, header["activation"], activation))
+
+    return header, len(magic) + 4 + length
+
+
+def game_config(header):
+    """
+    :param header: The header of a brain file
+    :return: snake_custom.GameConfig the brains of the file were saved with
+    """
+    return snake_custom.GameConfig.from_dict(header["game"])
+
+
+def load(path, mmap=True):
+    """
+    Load the genomes of a brain file
+    :param path: Path of the brain file
+    :param mmap: Map the genomes from the file read only, instead of reading them all into memory
+    :return: The (N, genome length) genomes, and the header
+    """
+    header, offset = read_header(path)
+    shape = tuple(header["shape"])
+
+    if mmap:
+        genomes = np.memmap(path, dtype=header["dtype"], mode="r", offset=offset, shape=shape)
+    else:
+        with open(path, "rb") as file:
+            file.seek(offset)
+            genomes = np.fromfile(file, dtype=header["dtype"], count=int(np.prod(shape))).reshape(shape)
+
+    return genomes, header
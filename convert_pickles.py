@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from dataclasses import replace
+import os
+import pickle
+import sys
+import numpy as np
+import brain_file
+import snake_custom
+from neural_network import layer_names
+
+"""
+Comments:
+Converts pickled snakes into brain files, see brain_file. Two kinds of pickles have been saved over time:
+    fittest_snake.pickle                        [SnakeBrain, fitness], from genetic_algorithm.py
+    Test copy/fittest_snake_<number>.pickle     {"snake": SnakeBrain, "snake_settings": str, "n_fruits": int}
+The SnakeBrains in them are from neural_network, or neural_network_2 which no longer exists, and have the game they last
+played pickled with them. Rather than importing those modules, every class of the NN and the game is loaded as a Stub
+that only keeps its attributes, which is all that's needed to get the weights and biases out.
+
+Every pickle is converted to a brain file with the same name, but ending in .brain. The pickles are left as they are.
+
+Usage: python convert_pickles.py fittest_snake.pickle "Test copy/fittest_snake_101.pickle" ...
+
+Requirements: numpy
+"""
+
+
+class Stub:
+    """
+    Stands in for any class of the NN or the game when unpickling, it just keeps the attributes it's given
+    """
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+
+class StubUnpickler(pickle.Unpickler):
+    """
+    Unpickler that loads the classes of the NN and game modules, whatever they were called, as Stubs
+    """
+    def find_class(self, module, name):
+        if module.startswith(("neural_network", "snake_custom")):
+            return Stub
+        return super().find_class(module, name)
+
+
+def convert(path):
+    """
+    Convert a pickled snake into a brain file next to it
+    :param path: Path of the pickle
+    :return: Path of the brain file
+    """
+    with open(path, "rb") as file:
+        saved = StubUnpickler(file).load()
+
+    metadata = {"converted_from": os.path.basename(path)}
+    fitness = None
+    if isinstance(saved, dict):
+        brain = saved["snake"]
+        metadata["snake_settings"] = saved.get("snake_settings")
+        metadata["n_fruits"] = saved.get("n_fruits")
+    else:
+        brain, fitness = saved[0], saved[1]
+
+    # The game settings weren't saved, other than the board size in the game of the brain
+    game = snake_custom.default_config()
+    board = getattr(getattr(brain, "game", None), "checker_board", None)
+    if board is not None:
+        game = replace(game, width=int(board.width), height=int(board.height), snake_spawn_coord=None)
+
+    weights = brain.weights_input_hidden1
+    sizes = (weights.shape[0], weights.shape[1], brain.weights_hidden2_output.shape[1])
+    genome = [getattr(brain, layer).ravel() for layer in layer_names]
+
+    brain_path = os.path.splitext(path)[0] + ".brain"
+    brain_file.save(brain_path, np.concatenate(genome), fitness, game, sizes, **metadata)
+    return brain_path
+
+
+if __name__ == '__main__':
+    for pickle_path in sys.argv[1:]:
+        print("{} => {}".format(pickle_path, convert(pickle_path)))
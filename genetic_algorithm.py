@@ -9,11 +9,20 @@ Comments: https://drive.google.com/file/d/108wd7DU3NtjuimirGHUgL_s3wb6FA7WA/view
 Requirements:
 """
 
-from random import randint, choice
 from math import ceil
-from heapq import nlargest
-import pickle
-from neural_network import SnakeBrain
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from time import perf_counter
+from dataclasses import asdict
+import argparse
+import hashlib
+import json
+import os
+import numpy as np
+import snake_custom
+import brain_file
+import profiler
+from neural_network import SnakeBrain, PopulationNetwork, crossover_batch, mutate_batch, genome_length
 
 # Global variables, placed them here instead of in the class just because these might be interesting to tinker with
 population_size = 50000
@@ -25,195 +34,831 @@ keep_per_gen = 25
 # How many new, completely random individuals to add each generation, seperate from the mutations
 freaks_per_gen = 50
 
-mutation_chance_percentage = 0
+# Chance for every single weight and bias of a child to mutate, 0 turns mutation off
+mutation_rate = 0.
+# Mutate by adding gaussian noise if True, or by resetting to a new random value if False
+gaussian_mutation = True
+# How large the mutations are for each layer, in the order of neural_network.layer_names. The standard deviation of the
+# noise for gaussian mutation, or the range of the new values for reset mutation. None for the default of the mutation
+# used, see default_mutation_scales
+mutation_scales = None
+# 0.1 for gaussian mutation, and -1 to 1 for reset mutation, the same range as new brains get their values from
+default_mutation_scales = {True: [0.1] * 6, False: [1.] * 6}
 
 use_uniform_crossover = True
 user_tournament_selection = False
+# How many snakes compete in each tournament, and whether a snake can be drawn more than once for the same tournament
+tournament_size = 2
+tournament_replacement = True
+# Use stochastic universal sampling for fitness based selection, it picks parents evenly spread over the fitnesses
+# instead of independently, so the parents match the fitness proportions more closely
+stochastic_universal_sampling = False
+# Select on the rank of the fitnesses instead of the fitnesses themselves, None, "linear" or "exponential". With the
+# 2**score fitness one lucky snake can otherwise get nearly every parent slot
+rank_selection = None
+# Linear ranking: how many times the expected parent slots of an average snake the best snake gets, from 1 to 2
+linear_rank_pressure = 1.5
+# Exponential ranking: every rank down gets this many times the chance of the rank above it, from 0 to 1
+exponential_rank_base = 0.999
 
 
 # Game details
 show_graphics = False
 spawn_fruits = True
 delay = 0
-
-
-print("Population size: {}\n"
-      "Parent pairs per generation: {}\n"
-      "Keep per generation: {}\n"
-      "Freaks per generation: {}\n"
-      "Mutation chance: {}%\n======================================"
-      .format(population_size, parent_pairs_per_gen, keep_per_gen, freaks_per_gen, mutation_chance_percentage))
+# The game the snakes are evolved in, ie. snake_custom.GameConfig(width=17, height=17) for the board of snake.py
+game_config = snake_custom.GameConfig()
+# Change the game as the run goes on, a list of (generation, GameConfig) pairs sorted by generation. From each generation
+# on the games are played with its config instead of game_config, ie. to start on small boards and grow them:
+# [(1, snake_custom.GameConfig(width=5, height=5)), (200, snake_custom.GameConfig(width=9, height=9))]
+curriculum = []
+# Play the games of the whole population at once, a lot faster than one game at a time. Not used with graphics
+batch_games = True
+# How many processes to play the games in, 0 plays them all in this process
+fitness_workers = 0
+# End the games of snakes that go in circles as soon as they start looping, the fitnesses stay the same, see
+# snake_custom.default_detect_loops
+detect_loops = False
+# Seed of the whole run, everything random is drawn from it. None for a new seed every run, the seed is printed so that
+# the run can be reproduced
+seed = None
+
+# Every snake plays the same game, every generation, instead of a new game each. Makes the fitness of a genome always the
+# same, which is what lets the fitness cache skip the kept individuals and the children identical to their parents
+shared_game = False
+# How many genomes to remember the scores of, the least recently used ones are forgotten first. 0 turns the cache off.
+# Only useful with shared_game, without it every individual plays a game of its own so no two plays are ever the same
+fitness_cache_size = 0
+
+# How many games every snake plays each generation, its fitness is the episode_aggregate of the fitnesses of its games.
+# One game is very noisy, a lucky snake can get a fitness it will never get again
+episodes_per_snake = 1
+# How to combine the fitnesses of the games, "mean", "min", or a percentile from 0 to 100, ie. 25
+episode_aggregate = "mean"
+# Play the games one at a time for every snake, and stop giving games to snakes that can't reach the keep_per_gen best
+# anymore. Spends the games on the snakes that matter, instead of finding out exactly how bad the worst ones are
+adaptive_episodes = False
+# How many standard errors above its mean a snake could still be, for adaptive_episodes. Higher stops fewer snakes
+episode_confidence = 2.
+
+# Save a checkpoint every this many generations, that the run can be resumed from with --resume. 0 turns them off
+checkpoint_every = 10
+checkpoint_path = "checkpoint.npz"
+# Compress the checkpoints, makes them barely smaller but takes a lot longer to write
+checkpoint_compressed = False
+
+# Append how long every stage of every generation took, and how many game steps and forward passes were done, as a line
+# of JSON to this file, see profiler. None turns it off, which costs next to nothing
+profile_path = None
+# Run cProfile over this whole generation and save its stats to profile_generation_<generation>.prof, to be read with
+# pstats. Only the main process is profiled, not the games played by fitness_workers. None for no generation
+cprofile_generation = None
+
+# The streams of random numbers every generation draws from, see GeneticAlgorithm.seed_sequence. Each gets its own
+# stream, so that ie. changing the mutation rate doesn't change the games that are played
+GAMES, SELECTION, CROSSOVER, MUTATION, FREAKS = range(5)
 
 
 class GeneticAlgorithm:
-    def __init__(self):
-        self.pop = Population()
+    def __init__(self, resume_from=None):
+        """
+        :param resume_from: Optional path of a checkpoint to continue from, see save_checkpoint. The settings of the
+                            checkpoint replace the globals of this module, so the run continues exactly like it would have
+        """
+        checkpoint = load_checkpoint(resume_from) if resume_from else None
 
-        self.converged = False
+        # Everything random in a generation is derived from this and the generation, so a generation can be played again
+        # from its seed and population, no matter the workers or what happened in the generations before it
+        self.seed = np.random.SeedSequence(seed).entropy if checkpoint is None else checkpoint["seed"]
+        print("Seed: {}".format(self.seed))
 
         self.generation = 1
 
         self.top_score = 0
 
-        latest_highest_fitnesses = []
+        self.latest_highest_fitnesses = []
 
-        while not self.converged:
-
-            # Play the game with every brain in the population, and save their fitness
-            self.pop.calc_fitness()
+        if checkpoint is None:
+            # The first population, the same as the freaks of a generation 0
+            self.pop = Population(rng=self.rng(FREAKS, generation=0))
+            # Whether the population has already played its games, only the case for a resumed checkpoint
+            self.evaluated = False
+        else:
+            self.pop = checkpoint["population"]
+            self.evaluated = True
+            self.generation = checkpoint["generation"]
+            self.top_score = checkpoint["top_score"]
+            self.latest_highest_fitnesses = checkpoint["latest_highest_fitnesses"]
+            print("Resumed from generation {} of {}".format(self.generation, resume_from))
 
-            # Save the fittest score of the current generation, only used for logging
-            self.pop.calc_fittest_score()
+        # Scores of genomes that have already played, see FitnessCache
+        self.fitness_cache = FitnessCache(fitness_cache_size) if fitness_cache_size else None
 
-            latest_highest_fitnesses.append(self.pop.highest_fitness)
-            if len(latest_highest_fitnesses) > 10:
-                latest_highest_fitnesses.pop(0)
+        # Worker processes are started once and reused for every generation
+        self.executor = ProcessPoolExecutor(max_workers=fitness_workers) if fitness_workers else None
 
-            # This is the new population we will be replacing the old one with
-            new_pop = []
+        self.profiler = profiler.GenerationProfiler(profile_path, cprofile_generation)
 
-            mutated = 0
-            print(len(self.pop.population))
+        self.converged = False
 
-            for _ in range(parent_pairs_per_gen):
+    def run(self):
+        """
+        Evolve generation after generation, forever
+        """
+        while not self.converged:
+            self.run_generation()
 
-                # Select two parents, where higher fitnesses equate to a higher chance to be selected
-                parent1 = self.pop.fitness_based_selection() if not user_tournament_selection else \
-                          self.pop.tournament_selection()
+    def run_generation(self):
+        """
+        Play the games of the current population, and replace it with the next generation bred from it
+        """
+        self.profiler.start(self.generation)
 
-                parent2 = self.pop.fitness_based_selection() if not user_tournament_selection else \
-                    self.pop.tournament_selection()
+        if not self.evaluated:
+            # Play the game with every brain in the population, and save their fitness
+            # With a shared game the game is the same every generation, from the games of generation 0
+            games = self.seed_sequence(GAMES, generation=0 if shared_game else None)
+            config = self.config()
+            if self.generation == 1 or config != self.config(self.generation - 1):
+                print("Playing on a {}x{} board".format(config.width, config.height))
+            self.pop.calc_fitness(games, self.executor, shared_game, self.fitness_cache, config)
+            self.profiler.lap("fitness")
+
+            # Everything after this point only depends on the fitnesses and the seed, so it's the place to resume from
+            if checkpoint_every and self.generation % checkpoint_every == 0:
+                self.save_checkpoint(checkpoint_path)
+                self.profiler.lap("checkpoint")
+        self.evaluated = False
+
+        # Find the fittest snake and the ones that are kept for the next generation
+        kept = self.pop.rank(keep_per_gen)
+        self.profiler.lap("rank")
+
+        latest_highest_fitnesses = self.latest_highest_fitnesses
+        latest_highest_fitnesses.append(self.pop.highest_fitness)
+        if len(latest_highest_fitnesses) > 10:
+            latest_highest_fitnesses.pop(0)
+
+        # Select two parents per pair, where higher fitnesses equate to a higher chance to be selected
+        selection_rng = self.rng(SELECTION)
+        if not user_tournament_selection:
+            weights = self.pop.rank_weights(rank_selection) if rank_selection else None
+            parent_indexes = self.pop.fitness_based_selection(parent_pairs_per_gen * 2, selection_rng,
+                                                              stochastic_universal_sampling, weights)
+        else:
+            parent_indexes = self.pop.tournament_selection(parent_pairs_per_gen * 2, selection_rng,
+                                                           tournament_size, tournament_replacement)
+        self.profiler.lap("selection")
+
+        # Create n children per parent pair, to keep a stable population size. It won't always be the start size
+        children_per_pair = int(ceil((len(self.pop) - keep_per_gen - freaks_per_gen) /
+                                     (parent_pairs_per_gen * 2)))
+        n_children = parent_pairs_per_gen * children_per_pair
+
+        # This is the new population we will be replacing the old one with, everything is written straight into it
+        # Layout: [first children, second children, kept individuals, freaks]
+        new_pop = PopulationStore(n_children * 2 + keep_per_gen + freaks_per_gen)
+        self.profiler.lap("allocation")
+
+        # Create every child of the generation at once from the chosen snakes, using the chosen crossover method
+        parents = self.pop.store.network
+        pairs = parent_indexes.reshape(-1, 2).repeat(children_per_pair, axis=0)
+        children1 = new_pop.network[:n_children]
+        children2 = new_pop.network[n_children:n_children * 2]
+        crossover_batch(parents[pairs[:, 0]], parents[pairs[:, 1]], use_uniform_crossover,
+                        out=(children1, children2), rng=self.rng(CROSSOVER))
+        self.profiler.lap("crossover")
+
+        # Mutate every child of the generation at once
+        mutated = 0
+        if mutation_rate:
+            scales = mutation_scales if mutation_scales is not None else default_mutation_scales[gaussian_mutation]
+            mutated = np.count_nonzero(mutate_batch(new_pop.network[:n_children * 2], mutation_rate,
+                                                    gaussian_mutation, scales, self.rng(MUTATION)))
+        self.profiler.lap("mutation")
+
+        # The top individuals are directly carried over to next generation
+        new_pop.genomes[n_children * 2:n_children * 2 + len(kept)] = self.pop.store.genomes[kept]
+
+        # Generate a few completely random new snakes
+        new_pop.randomize(n_children * 2 + len(kept), self.rng(FREAKS))
+        self.profiler.lap("kept_and_freaks")
+
+        print("Generation: {}  ||  Highest fitness: {}  || Average highest last 10:  {}  ||  Mutated children: {}"
+              "  ||  Games per snake: {}  ||  Cache hits: {}%".
+              format(str(self.generation).rjust(5),
+                     "{:g}".format(self.pop.highest_fitness).rjust(5),
+                     str(sum(latest_highest_fitnesses) / 10)[:5].rjust(5),
+                     str(mutated).rjust(5),
+                     str(round(self.pop.games_played / len(self.pop), 2)).rjust(5),
+                     str(round(100 * self.pop.cache_hits / max(self.pop.games_played, 1), 1)).rjust(5)))
+
+        # Save fit snake for testing
+        if self.pop.highest_fitness > self.top_score:
+            brain_file.save("fittest_snake.brain", self.pop.store.genomes[self.pop.fittest_index],
+                            self.pop.highest_fitness, self.config(), fruits=spawn_fruits,
+                            generation=self.generation, seed=str(self.seed))
+            self.top_score = self.pop.highest_fitness
+            print("Saved snake!")
+        self.profiler.lap("log_and_save")
+
+        # Create a new population with the new and improved children of the old parents
+        evaluated = self.pop
+        self.pop = Population(store=new_pop)
+        self.profiler.lap("population")
+
+        # How the first game of every snake ended
+        terminations = np.bincount(evaluated.store.termination, minlength=len(snake_custom.terminations))
+        self.profiler.finish(population=len(evaluated), games_played=evaluated.games_played,
+                             cache_hits=evaluated.cache_hits, highest_fitness=float(evaluated.highest_fitness),
+                             mutated=int(mutated),
+                             terminations=dict(zip(snake_custom.terminations[1:], terminations[1:].tolist())))
+        self.generation += 1
+
+    def save_checkpoint(self, path):
+        """
+        Save everything needed to continue the run from the current generation, which has played its games. The
+        random state doesn't have to be saved, it is derived from the seed and the generation.
+        The file is written next to path first and then moved over it, so a crash while writing never leaves a broken
+        checkpoint behind. It is not compressed by default, as compressing 50000 genomes takes seconds and the
+        random looking floats barely get any smaller.
 
-                # Create n children per parent pair, to keep a stable population size. It won't always be the start size
-                for n in range(int(ceil((len(self.pop.population) - keep_per_gen - freaks_per_gen) /
-                                        (parent_pairs_per_gen * 2)))):
+        :param path: Where to save the checkpoint, a .npz file
+        """
+        start = perf_counter()
+        store = self.pop.store
+        temporary_path = path + ".tmp"
+
+        try:
+            with open(temporary_path, "wb") as file:
+                # The fitnesses are saved as floats, like PopulationStore.fitness, as they don't fit in an int64
+                (np.savez_compressed if checkpoint_compressed else np.savez)(
+                    file,
+                    version=checkpoint_version,
+                    genomes=store.genomes, fitness=store.fitness, score=store.score, age=store.age,
+                    termination=store.termination,
+                    games_played=self.pop.games_played, cache_hits=self.pop.cache_hits,
+                    generation=self.generation, seed=str(self.seed), top_score=np.float64(self.top_score),
+                    latest_highest_fitnesses=np.array(self.latest_highest_fitnesses, dtype=np.float64),
+                    settings=json.dumps({name: globals()[name] for name in checkpoint_settings}, default=asdict))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary_path, path)
+        except BaseException:
+            # Don't leave the half written file behind
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+
+        print("Saved checkpoint of generation {} in {:.2f}s".format(self.generation, perf_counter() - start))
+
+    def config(self, generation=None):
+        """
+        :param generation: The generation to get the game of, the current one by default
+        :return: The snake_custom.GameConfig the generation plays, from the curriculum or game_config
+        """
+        if generation is None:
+            generation = self.generation
+        config = game_config
+        for start, curriculum_config in curriculum:
+            if start <= generation:
+                config = curriculum_config
+        return config
+
+    def seed_sequence(self, stream, generation=None):
+        """
+        :param stream: Which stream of random numbers, one of GAMES, SELECTION, CROSSOVER, MUTATION, FREAKS
+        :param generation: The generation to get the stream of, the current one by default
+        :return: SeedSequence of the stream, always the same for the same run seed, generation and stream
+        """
+        if generation is None:
+            generation = self.generation
+        return np.random.SeedSequence(self.seed, spawn_key=(generation, stream))
 
-                    # Create child from two chosen snakes, using the chosen crossover method
-                    child_snake1, child_snake2 = parent1.single_point_crossover(parent2) \
-                        if not use_uniform_crossover \
-                        else parent1.uniform_crossover(parent2)
+    def rng(self, stream, generation=None):
+        """
+        :return: A new numpy Generator of a stream, see seed_sequence
+        """
+        return np.random.default_rng(self.seed_sequence(stream, generation))
 
-                    # % Chance of mutation
-                    if randint(1, 100) <= mutation_chance_percentage:
-                        # Select a child at random to mutate
-                        choice([child_snake1, child_snake2]).mutate()
-                        mutated += 1
 
-                    new_pop.append(child_snake1)
-                    new_pop.append(child_snake2)
+class PopulationStore:
+    """
+    The genomes of a whole population in one contiguous (N, genome length) array, see neural_network.split_genomes,
+    together with an array each for their fitnesses, scores, ages and terminations.
+    Keeping a population as a list of SnakeBrains meant six small arrays and a game per brain, hundreds of thousands of
+    small objects for a large population. Here the network and brains are views of the genomes, made when needed.
+    """
+    def __init__(self, size):
+        """
+        :param size: How many individuals to store, their genomes are not initialized
+        """
+        self.genomes = np.empty((size, genome_length()))
 
-            # Select top individuals to be directly carried over to next generation, from a sorted population
-            for snake in sorted(self.pop.population, key=lambda e: e[1], reverse=True)[:keep_per_gen]:
-                new_pop.append(snake[0])
+        # The layers of every genome, stacked, without copying them
+        self.network = PopulationNetwork.from_genomes(self.genomes)
 
-            # Generate a few completely random new snakes
-            for i in range(freaks_per_gen):
-                new_pop.append(SnakeBrain())
+        # Floats, as 2**score fitnesses can get larger than fits in an int64. They are still exact, as age * 2**score
+        # is a small number times a power of two
+        self.fitness = np.zeros(size)
+        self.score = np.zeros(size, dtype=np.int64)
+        self.age = np.zeros(size, dtype=np.int64)
+        # Why the game ended, as indexes into snake_custom.terminations, ie. to tell looping snakes from starving ones
+        self.termination = np.zeros(size, dtype=np.int8)
 
-            print("Generation: {}  ||  Highest fitness: {}  || Average highest last 10:  {}  ||  Mutated children: {}".
-                  format(str(self.generation).rjust(5),
-                         str(self.pop.highest_fitness).rjust(5),
-                         str(sum(latest_highest_fitnesses) / 10)[:5].rjust(5),
-                         str(mutated).rjust(5)))
+    def __len__(self):
+        return len(self.genomes)
 
-            # Save fit snake for testing
-            if self.pop.highest_fitness > self.top_score:
-                with open("fittest_snake.pickle", "wb") as snake:
-                    pickle.dump(self.pop.population[self.pop.fittest_index], snake)
-                    self.top_score = self.pop.highest_fitness
-                    print("Saved snake!")
+    def brain(self, index):
+        """
+        :param index: The index of an individual
+        :return: A SnakeBrain using the individuals genome, without copying it
+        """
+        return SnakeBrain.from_genome(self.genomes[index])
 
-            # Create a new population with the new and improved children of the old parents
-            self.pop = Population(pop_size=0, existing_brains=new_pop)
+    def randomize(self, start=0, rng=None):
+        """
+        Give every individual from start and onwards new random weights and biases, like a new SnakeBrain has
+        :param rng: numpy Generator to draw the weights and biases from
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        self.genomes[start:] = rng.uniform(low=-1, size=self.genomes[start:].shape)
 
-            self.generation += 1
+    def memory_per_individual(self):
+        """
+        :return: Bytes used per individual for its genome, fitness, score, age and termination
+        """
+        return (self.genomes.nbytes + self.fitness.nbytes + self.score.nbytes + self.age.nbytes +
+                self.termination.nbytes) / max(len(self), 1)
 
 
 class Population:
-    def __init__(self, pop_size=population_size, existing_brains=list()):
-
-        self.population = []
-
-        # Populate population with new snek brains
-        if not existing_brains:
-            for _ in range(pop_size):
-                # Append a brain, and it's fitness. Fitnesses start at zero.
-                # A pair of [SnakeBrain, Fitness] will be reffered to as 'snake'
-                self.population.append([SnakeBrain(), 0])
-        # Reset the fitness of all the old snek brains, and add them to the population
+    def __init__(self, pop_size=population_size, store=None, rng=None):
+        """
+        :param pop_size: How many new random snakes to populate the population with
+        :param store: An existing PopulationStore to use instead, ie. the children of the last generation
+        :param rng: numpy Generator to draw the new random snakes from
+        """
+        # Populate population with new snek brains, fitnesses start at zero
+        if store is None:
+            store = PopulationStore(pop_size)
+            store.randomize(rng=rng)
+        # The fitnesses of a new generation start at zero
         else:
-            for brain in existing_brains:
-                self.population.append([brain, 0])
+            store.fitness[:] = 0
+
+        self.store = store
 
         # Just for logging
         self.highest_fitness = 0
         self.fittest_index = 0
+        # How many games were played for the fitnesses, and how many of them came from the cache, or from an identical
+        # individual, instead of being played
+        self.games_played = 0
+        self.cache_hits = 0
+
+    def __len__(self):
+        return len(self.store)
 
-    def calc_fitness(self):
+    def calc_fitness(self, seed_sequence=None, executor=None, shared_game=False, cache=None, config=None):
         """
-        This is where we tell the brains to play the game, and save their score as their fitness
+        This is where we tell the brains to play the game, and save their score as their fitness.
+        Every brain plays episodes_per_snake games, and its fitness is the episode_aggregate of the fitnesses of them.
+
+        :param seed_sequence: SeedSequence that the seed of every individuals game is spawned from, in population order.
+                              A new random one is used if not given
+        :param executor: Optional process pool to split the games over, the fitnesses are the same without it
+        :param shared_game: Every individual plays the same game, seeded by seed_sequence itself
+        :param cache: Optional FitnessCache, games that are in it aren't played again, and identical individuals only
+                      play a game once
+        :param config: The snake_custom.GameConfig of the games, game_config if not given
         :return:
         """
+        if seed_sequence is None:
+            seed_sequence = np.random.SeedSequence()
+        if shared_game:
+            seeds = [seed_sequence] * len(self)
+        else:
+            # The same seeds as seed_sequence.spawn, but without changing seed_sequence, so that the same seed_sequence
+            # always plays the same games
+            seeds = [np.random.SeedSequence(seed_sequence.entropy, spawn_key=seed_sequence.spawn_key + (i,),
+                                            pool_size=seed_sequence.pool_size) for i in range(len(self))]
+        store = self.store
+
+        # The fitness of every game of every individual, nan for the games that weren't played
+        fitnesses = np.full((len(self), episodes_per_snake), np.nan)
+        self.cache_hits = 0
+        self.games_played = 0
+
+        # Every game is played at once, or with adaptive_episodes one game per individual at a time
+        if adaptive_episodes:
+            rounds = [[episode] for episode in range(episodes_per_snake)]
+        else:
+            rounds = [list(range(episodes_per_snake))]
+
+        playing = np.arange(len(self))
+        for played, episodes in enumerate(rounds, 1):
+            individuals = np.repeat(playing, len(episodes))
+            episode_indexes = np.tile(episodes, len(playing))
+            score, age, termination = self.play_games(individuals, [episode_seed(seeds[i], episode) for i, episode in
+                                                                    zip(individuals, episode_indexes)],
+                                                      executor, cache, config)
 
-        for i, snake in enumerate(self.population):
-            # Returns the score of the brains game
-            score, age = snake[0].play(graphical=show_graphics, delay=delay, fruits=spawn_fruits)
             # The main fitness function
-            fitness = age * 2**score
-            self.population[i][1] = fitness  # Update the brains fitness in the population list
+            fitnesses[individuals, episode_indexes] = age * np.exp2(score)
+
+            # The score, age and termination of the first game are kept, it's the same game as with one episode
+            first = episode_indexes == 0
+            store.score[individuals[first]], store.age[individuals[first]] = score[first], age[first]
+            store.termination[individuals[first]] = termination[first]
+
+            if adaptive_episodes and 1 < played < len(rounds):
+                playing = playing[self.could_be_kept(fitnesses, playing, played)]
+
+        store.fitness[:] = aggregate_episodes(fitnesses)
+        self.games_played = int(np.count_nonzero(~np.isnan(fitnesses)))
 
-    def calc_fittest_score(self):
+    def could_be_kept(self, fitnesses, playing, played):
         """
-        Set self.fittest to the score snake that has the highest fittness identical fitnesses
-        the last snake will be selected
-        :return:
+        Which of the playing individuals could still end up among the keep_per_gen fittest, the others aren't worth
+        playing more games with. For the mean the upper confidence bound of the mean is compared to the current fitness
+        of the keep_per_gen'th fittest individual, also for percentiles as an approximation. The minimum can only go
+        down, so there it's compared as it is.
+
+        :param fitnesses: The fitness of every game of every individual, nan for games that weren't played
+        :param playing: The individuals that have played every game so far
+        :param played: How many games they have played
+        :return: Boolean array, True for the individuals in playing that should play more games
+        """
+        k = min(keep_per_gen, len(self))
+        if k <= 0:
+            return np.ones(len(playing), dtype=bool)
+        cut = np.partition(aggregate_episodes(fitnesses), len(self) - k)[len(self) - k]
+
+        games = fitnesses[playing, :played]
+        if episode_aggregate == "min":
+            return games.min(axis=1) >= cut
+
+        upper = games.mean(axis=1) + episode_confidence * games.std(axis=1, ddof=1) / np.sqrt(played)
+        return upper >= cut
+
+    def play_games(self, indexes, seeds, executor=None, cache=None, config=None):
+        """
+        Play a game with each of some of the individuals, an individual may be in indexes any number of times
+        :param indexes: Array of the individuals to play a game with
+        :param seeds: The seed of each game
+        :param executor: Optional process pool to split the games over
+        :param cache: Optional FitnessCache, games that are in it aren't played again
+        :param config: The snake_custom.GameConfig of the games, game_config if not given
+        :return: Arrays of the scores, ages and terminations of the games
+        """
+        if config is None:
+            config = game_config
+        score = np.zeros(len(indexes), dtype=np.int64)
+        age = np.zeros(len(indexes), dtype=np.int64)
+        termination = np.zeros(len(indexes), dtype=np.int8)
+        playing = np.arange(len(indexes))
+
+        if cache is not None:
+            keys = [cache.key(self.store.genomes[i], seed, config, spawn_fruits) for i, seed in zip(indexes, seeds)]
+
+            # The first game of every key that isn't cached is the one to play it
+            first = {}
+            for j, key in enumerate(keys):
+                cached = cache.get(key)
+                if cached is not None:
+                    score[j], age[j], termination[j] = cached
+                elif key not in first:
+                    first[key] = j
+            playing = np.fromiter(first.values(), dtype=np.intp, count=len(first))
+
+        if len(playing):
+            score[playing], age[playing], termination[playing] = self.play_brains(
+                indexes[playing], [seeds[j] for j in playing], executor, config)
+
+        if cache is not None:
+            for key, j in first.items():
+                cache.put(key, (score[j], age[j], termination[j]))
+            # The games of identical individuals get the score, age and termination of the one that was played
+            for j, key in enumerate(keys):
+                played = first.get(key, j)
+                if played != j:
+                    score[j], age[j], termination[j] = score[played], age[played], termination[played]
+
+            self.cache_hits += len(indexes) - len(playing)
+
+        return score, age, termination
+
+    def play_brains(self, indexes, seeds, executor=None, config=None):
+        """
+        Play the games of some of the individuals
+        :param indexes: Array of the individuals to play a game with
+        :param seeds: The seed of each game
+        :param executor: Optional process pool to split the games over
+        :param config: The snake_custom.GameConfig of the games, game_config if not given
+        :return: Arrays of the scores, ages and terminations of the games, see PopulationStore.termination
+        """
+        store = self.store
+        if config is None:
+            config = game_config
+
+        if batch_games and not show_graphics:
+            # Every brain plays at the same time, the results come back in the order of the indexes
+            if executor is None:
+                return store.network.play(fruits=spawn_fruits, seeds=seeds, brains=indexes, config=config,
+                                          detect_loops=detect_loops)
+
+            # Only the genomes are sent to the workers, in a few shards per worker to even out the load
+            shard_size = int(ceil(len(indexes) / (max(fitness_workers, 1) * 4)))
+            starts = range(0, len(indexes), shard_size)
+            results = list(executor.map(play_shard,
+                                        [store.genomes[indexes[i:i+shard_size]] for i in starts],
+                                        [spawn_fruits] * len(starts),
+                                        [seeds[i:i+shard_size] for i in starts],
+                                        [config] * len(starts),
+                                        [detect_loops] * len(starts)))
+            for *_, counters in results:
+                profiler.add_counters(counters)
+            return [np.concatenate([result[k] for result in results]) for k in (0, 1, 2)]
+
+        # Returns the score of the brains game
+        results = [store.brain(i).play(graphical=show_graphics, delay=delay, fruits=spawn_fruits, seed=seed,
+                                       config=config, detect_loops=detect_loops) for i, seed in zip(indexes, seeds)]
+        return (np.array([result[0] for result in results]), np.array([result[1] for result in results]),
+                np.array([snake_custom.terminations.index(result[2]) for result in results], dtype=np.int8))
+
+    def rank(self, k):
         """
-        max_fit = 0
+        Find the k fittest snakes, and set self.fittest_index and self.highest_fitness to the fittest one.
+        Only the top k are sorted, the rest of the population is just partitioned away from them.
 
-        for i, snake in enumerate(self.population):
-            if snake[1] >= max_fit:
-                max_fit = snake[1]
-                self.fittest_index = i
+        :param k: How many of the fittest snakes to return
+        :return: Array of the indexes of the k fittest snakes, fittest first
+        """
+        fitness = self.store.fitness
+
+        # The first of the highest fitnesses, a float as the aggregate of several episodes doesn't have to be whole
+        self.fittest_index = int(np.argmax(fitness))
+        self.highest_fitness = float(fitness[self.fittest_index])
 
-        self.highest_fitness = max_fit
+        k = min(k, len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp)
 
-        # print("Fittest:", sorted(self.population, key=lambda e: e[1], reverse=True)[0][0].id)
-        # print("HF:", self.highest_fitness)
-        # print("HI:", self.fittest_index)
-        # print(self.population[self.fittest_index][0].id)
+        top = np.argpartition(-fitness, k - 1)[:k]
+        return top[np.argsort(-fitness[top], kind="stable")]
 
-    def fitness_based_selection(self):
+    def rank_weights(self, ranking="linear"):
+        """
+        Selection weights from the rank of every snakes fitness rather than the fitness itself, so how much fitter
+        the best snake is doesn't matter, only that it's the best. Snakes with the same fitness get neighbouring ranks.
+
+        :param ranking: "linear", weights going down evenly from the best to the worst, see linear_rank_pressure.
+                        "exponential", every rank down weighs exponential_rank_base times the one above it
+        :return: Array of the weights, in population order, to use in fitness_based_selection
+        """
+        n = len(self)
+        # 0 for the worst snake, n-1 for the best
+        ranks = np.empty(n)
+        ranks[np.argsort(self.store.fitness, kind="stable")] = np.arange(n)
+
+        if ranking == "linear":
+            return (2 - linear_rank_pressure) + 2 * (linear_rank_pressure - 1) * ranks / max(n - 1, 1)
+        elif ranking == "exponential":
+            return np.power(exponential_rank_base, n - 1 - ranks)
+        raise ValueError("Unknown ranking {!r}, use \"linear\" or \"exponential\"".format(ranking))
+
+    def fitness_based_selection(self, n, rng=None, stochastic_universal=False, weights=None):
         """
-        A slection process that chooses a snake, where a snake with a higher fitness has a higher chance of being
-        selected
-        :return: The chosen snakes brain
+        A slection process that chooses snakes, where a snake with a higher fitness has a higher chance of being
+        selected. Every snake is chosen with the probability fitness / sum of fitnesses.
+
+        The cumulative sum of the fitnesses is built once, and every parent is then found in it with a binary search,
+        instead of summing up the population again for every parent.
+
+        :param n: How many snakes to select
+        :param rng: numpy Generator to draw the selection from
+        :param stochastic_universal: Use stochastic universal sampling, which draws a single random offset and selects
+                                     the snakes at n evenly spaced points from there
+        :param weights: Select on these instead of the fitnesses, ie. from rank_weights
+        :return: Array of the indexes of the chosen snakes in the population
         """
-        sum_fitnesses = sum(list([snake[1] for snake in self.population]))
+        if rng is None:
+            rng = np.random.default_rng()
 
-        # A random cutoff digit.
-        r = randint(0, sum_fitnesses)
+        cumulative_fitnesses = np.cumsum(self.store.fitness if weights is None else weights)
+        sum_fitnesses = cumulative_fitnesses[-1]
 
-        current_sum = 0
+        # Every snake has the same fitness of 0, so they all get the same chance
+        if sum_fitnesses <= 0:
+            return rng.integers(0, len(self), n)
 
-        for snake in self.population:
-            current_sum += snake[1]
-            if current_sum >= r:
-                # Return brain of chosen snake
-                return snake[0]
-        print("==== FAILED ====")
-        print("Sum:", sum_fitnesses)
-        print("Point", r)
-        print("Current:", current_sum)
-        return self.population[0][0]
+        if stochastic_universal:
+            # The points are in order, shuffle them so that parents are paired up randomly
+            points = (rng.random() + np.arange(n)) * (sum_fitnesses / n)
+            points = rng.permutation(points)
+        else:
+            # A random cutoff digit for every parent.
+            points = rng.random(n) * sum_fitnesses
+
+        # The first snake where the cumulative sum goes past the cutoff
+        return np.searchsorted(cumulative_fitnesses, points, side="right").clip(max=len(self) - 1)
 
-    def tournament_selection(self, size=2):
+    def tournament_selection(self, n, rng=None, size=2, replacement=True):
+        """
+        A selection process where random snakes compete in tournaments, and the one with the highest fitness in each
+        tournament is selected. All the tournaments are drawn at once as an n x size matrix of indexes.
+        Only the fitnesses of the competing snakes are looked at, so it doesn't go through the whole population.
+
+        :param n: How many snakes to select, which is also the number of tournaments
+        :param rng: numpy Generator to draw the tournaments from
+        :param size: How many snakes compete in each tournament
+        :param replacement: Whether the same snake can be drawn more than once for a tournament
+        :return: Array of the indexes of the winning snakes in the population
+        """
+        if rng is None:
+            rng = np.random.default_rng()
 
-        candidates = [choice(self.population) for _ in range(size)]
+        if not replacement and size > len(self):
+            raise ValueError("Tournaments of {} snakes can't be drawn without replacement from {} snakes"
+                             .format(size, len(self)))
 
-        winners = nlargest(2, candidates)  # todo
+        if replacement or size * size <= 2 * len(self):
+            candidates = rng.integers(0, len(self), (n, size))
+        else:
+            # Tournaments that are large compared to the population would almost never be drawn without a duplicate,
+            # so every tournament is the first size snakes of a random order of the whole population instead. A few
+            # tournaments at a time, to not need n x population random numbers at once
+            candidates = np.empty((n, size), dtype=np.intp)
+            rows = max(1, 2**22 // len(self))
+            for start in range(0, n, rows):
+                order = rng.random((min(rows, n - start), len(self)))
+                candidates[start:start + rows] = np.argpartition(order, size - 1, axis=1)[:, :size]
+
+        if not replacement:
+            # Draw the tournaments that got the same snake twice again, until there are no duplicates left. With at
+            # most sqrt(2 * population) snakes per tournament, about a third of them have no duplicates on every draw
+            while True:
+                sorted_candidates = np.sort(candidates, axis=1)
+                duplicates = np.flatnonzero((sorted_candidates[:, 1:] == sorted_candidates[:, :-1]).any(axis=1))
+                if not len(duplicates):
+                    break
+                candidates[duplicates] = rng.integers(0, len(self), (len(duplicates), size))
+
+        return candidates[np.arange(n), np.argmax(self.store.fitness[candidates], axis=1)]
+
+
+class FitnessCache:
+    """
+    The score, age and termination of genomes that have already played a game, so that playing the same genome in the
+    same game again can be skipped. Genomes are told apart by a hash of their bytes, the game by its seed, GameConfig and
+    fruits. Holds at most size genomes, the least recently used one is forgotten when a new one doesn't fit.
+    """
+    def __init__(self, size):
+        """
+        :param size: How many genomes to remember
+        """
+        self.size = size
+        self.entries = OrderedDict()
 
-        return winners
+    def __len__(self):
+        return len(self.entries)
 
+    @staticmethod
+    def key(genome, seed, config, fruits):
+        """
+        :param genome: The genome that plays the game
+        :param seed: SeedSequence of the game
+        :param config: snake_custom.GameConfig of the game
+        :param fruits: Whether the game spawns fruits
+        :return: The key of the genome playing the game
+        """
+        return (hashlib.blake2b(genome.tobytes(), digest_size=16).digest(), seed.entropy, seed.spawn_key,
+                seed.pool_size, config, fruits)
 
+    def get(self, key):
+        """
+        :return: The score, age and termination of the key, or None if it isn't cached
+        """
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
 
-GeneticAlgorithm()
+    def put(self, key, value):
+        """
+        :param value: The score, age and termination of the key
+        """
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+def episode_seed(seed, episode):
+    """
+    :param seed: SeedSequence of a snakes first game
+    :param episode: Which of the snakes games
+    :return: SeedSequence of the game, the first game is played with the seed itself
+    """
+    if not episode:
+        return seed
+    return np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key + (int(episode),), pool_size=seed.pool_size)
+
+
+def aggregate_episodes(fitnesses):
+    """
+    :param fitnesses: The fitness of every game of every individual, nan for games that weren't played
+    :return: The fitness of every individual, the episode_aggregate of its games
+    """
+    if episode_aggregate == "mean":
+        return np.nanmean(fitnesses, axis=1)
+    elif episode_aggregate == "min":
+        return np.nanmin(fitnesses, axis=1)
+    return np.nanpercentile(fitnesses, episode_aggregate, axis=1)
+
+
+# The version of the checkpoint files, and the settings that are saved in them and restored when resuming
+checkpoint_version = 1
+checkpoint_settings = ["parent_pairs_per_gen", "keep_per_gen", "freaks_per_gen",
+                       "mutation_rate", "gaussian_mutation", "mutation_scales",
+                       "use_uniform_crossover", "user_tournament_selection", "tournament_size", "tournament_replacement",
+                       "stochastic_universal_sampling", "rank_selection", "linear_rank_pressure",
+                       "exponential_rank_base", "spawn_fruits", "detect_loops", "shared_game", "episodes_per_snake",
+                       "episode_aggregate", "adaptive_episodes", "episode_confidence", "game_config", "curriculum"]
+
+
+def load_checkpoint(path):
+    """
+    Load a checkpoint saved by GeneticAlgorithm.save_checkpoint, and set the settings of this module to the ones the
+    checkpoint was saved with
+    :param path: Path of the checkpoint
+    :return: Dict of the population, generation, seed, top_score and latest_highest_fitnesses
+    """
+    with np.load(path) as data:
+        if int(data["version"]) != checkpoint_version:
+            raise ValueError("{} is a version {} checkpoint, only version {} can be resumed"
+                             .format(path, int(data["version"]), checkpoint_version))
+
+        settings = json.loads(str(data["settings"]))
+        # The GameConfigs were saved as dicts
+        if "game_config" in settings:
+            settings["game_config"] = snake_custom.GameConfig.from_dict(settings["game_config"])
+            settings["curriculum"] = [(generation, snake_custom.GameConfig.from_dict(config))
+                                      for generation, config in settings["curriculum"]]
+        globals().update(settings)
+
+        store = PopulationStore(len(data["genomes"]))
+        store.genomes[:] = data["genomes"]
+        population = Population(store=store)
+        store.fitness[:], store.score[:], store.age[:] = data["fitness"], data["score"], data["age"]
+        # Checkpoints from before the terminations were kept don't have them
+        if "termination" in data:
+            store.termination[:] = data["termination"]
+        population.games_played = int(data["games_played"])
+        population.cache_hits = int(data["cache_hits"])
+
+        return {"population": population,
+                "generation": int(data["generation"]),
+                "seed": int(str(data["seed"])),
+                "top_score": float(data["top_score"]),
+                "latest_highest_fitnesses": [float(fitness) for fitness in data["latest_highest_fitnesses"]]}
+
+
+def play_shard(genomes, fruits, seeds, config, detect_loops):
+    """
+    Play the games of a part of the population, run in the worker processes of calc_fitness
+    :param genomes: The genomes of the brains in the shard
+    :param fruits: Whether or not to spawn fruits
+    :param seeds: The seed of every brains game
+    :param config: The snake_custom.GameConfig of the games
+    :param detect_loops: Whether to end games that loop, passed along as the globals of the main process aren't set in
+                         the workers
+    :return: Arrays of the scores, ages and terminations, and the profiler counters of the games
+    """
+    # Whatever the counters held when the worker was started belongs to the main process
+    profiler.take_counters()
+    score, age, termination = PopulationNetwork.from_genomes(genomes).play(fruits=fruits, seeds=seeds, config=config,
+                                                                           detect_loops=detect_loops)
+    return score, age, termination, profiler.take_counters()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Evolve neural networks that play snake")
+    parser.add_argument("--resume", nargs="?", const=checkpoint_path, metavar="CHECKPOINT",
+                        help="Continue a run from a checkpoint, {} by default".format(checkpoint_path))
+    args = parser.parse_args()
+
+    genetic_algorithm = GeneticAlgorithm(resume_from=args.resume)
+
+    print("Population size: {}\n"
+          "Parent pairs per generation: {}\n"
+          "Keep per generation: {}\n"
+          "Freaks per generation: {}\n"
+          "Mutation rate: {} ({})\n"
+          "Rank selection: {}\n======================================"
+          .format(len(genetic_algorithm.pop), parent_pairs_per_gen, keep_per_gen, freaks_per_gen, mutation_rate,
+                  "Gaussian" if gaussian_mutation else "Reset", rank_selection))
+
+    genetic_algorithm.run()
@@ -11,8 +11,97 @@ Requirements:
 
 from time import sleep
 import numpy as np
-import random
 import snake_custom
+import snake_batch
+import brain_file
+import profiler
+
+
+# The attributes holding the layers of SnakeBrain and PopulationNetwork, in the order they are fed forward
+layer_names = ["weights_input_hidden1", "biases_input_hidden1",
+               "weights_hidden1_hidden2", "biases_hidden1_hidden2",
+               "weights_hidden2_output", "biases_hidden2_output"]
+
+
+def layer_shapes(input_size=24, nodes_per_layer=8, output_size=4):
+    """
+    :return: The shapes of the layers of a brain, in the order of layer_names
+    """
+    return [(input_size, nodes_per_layer), (input_size,),
+            (nodes_per_layer, nodes_per_layer), (nodes_per_layer,),
+            (nodes_per_layer, output_size), (output_size,)]
+
+
+def split_genomes(genomes, input_size=24, nodes_per_layer=8, output_size=4):
+    """
+    A genome is every weight and bias of a brain laid out after each other in one flat array, in the order of
+    layer_names. This splits genomes up into their layers without copying anything, so writing to a layer writes to
+    the genome.
+
+    :param genomes: A single genome, or an array of genomes with the genome as the last dimension
+    :return: List of views of the layers, in the order of layer_names
+    """
+    layers = []
+    start = 0
+    for shape in layer_shapes(input_size, nodes_per_layer, output_size):
+        size = int(np.prod(shape))
+        layers.append(genomes[..., start:start+size].reshape(genomes.shape[:-1] + shape))
+        start += size
+
+    return layers
+
+
+def genome_length(input_size=24, nodes_per_layer=8, output_size=4):
+    return sum(int(np.prod(shape)) for shape in layer_shapes(input_size, nodes_per_layer, output_size))
+
+
+def crossover_mask(shape, uniform, rng=None):
+    """
+    Draw which values of a layer a child gets from its first parent, in one call to the random generator.
+    Uniform crossover picks every value from either parent with a 0.5 chance. Single point crossover picks a random point
+    in every row, and the values before it are from the first parent. For biases the row is the whole array.
+
+    :param shape: Shape of the layer, may have any number of leading dimensions, ie. stacked layers of a population
+    :param uniform: Uniform crossover if True, single point crossover if False
+    :param rng: numpy Generator to draw the mask from
+    :return: Boolean mask of the shape, True where the value is from the first parent
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    if uniform:
+        return rng.integers(0, 2, size=shape, dtype=bool)
+
+    # A point per row, which may be anywhere from before the first value to after the last one
+    points = rng.integers(0, shape[-1] + 1, size=shape[:-1])
+    return np.arange(shape[-1]) < points[..., np.newaxis]
+
+
+def crossover_layer(arr1, arr2, uniform, out1=None, out2=None, rng=None):
+    """
+    Crossover one layer of two parents into two children. The children are written into their own buffers, the parents
+    are never written to, so the same parents can be crossed over again and again.
+
+    :param arr1: The layer of the first parent
+    :param arr2: The layer of the second parent
+    :param uniform: Uniform crossover if True, single point crossover if False
+    :param out1: Optional preallocated array for the first child, must not be one of the parents arrays
+    :param out2: Optional preallocated array for the second child, must not be one of the parents arrays
+    :param rng: numpy Generator to draw the crossover from
+    :return: the layers of the two children
+    """
+    mask = crossover_mask(arr1.shape, uniform, rng)
+
+    out1 = np.empty_like(arr1) if out1 is None else out1
+    out2 = np.empty_like(arr2) if out2 is None else out2
+
+    # Where the mask is True child1 gets the value from the first parent and child2 from the second parent
+    np.copyto(out1, arr2)
+    np.copyto(out1, arr1, where=mask)
+    np.copyto(out2, arr1)
+    np.copyto(out2, arr2, where=mask)
+
+    return out1, out2
 
 
 class SnakeBrain:
@@ -24,10 +113,16 @@ class SnakeBrain:
     Output nodes: 4. 1 for each direction the snake can choose
 
     """
-    def __init__(self, weights=None, biases=None, input_size=24, nodes_per_layer=8, output_size=4):
+    def __init__(self, weights=None, biases=None, input_size=24, nodes_per_layer=8, output_size=4, rng=None):
+        """
+        :param rng: numpy Generator to draw the random weights and biases from, when none are given
+        """
 
         # Create a brain with random weights and biases
         if not weights and not biases:
+            if rng is None:
+                rng = np.random.default_rng()
+
             """
             Initialize random (normalised) weights and biases, and add them to a 2D array.
             2D arrays are used so that we can change shape of our input to the shape of our output.
@@ -53,21 +148,18 @@ class SnakeBrain:
 
             # The weights and biases between the inputs and hidden layer 1
             # Shape: input_size x nodes_per_layer == 24x8
-            self.weights_input_hidden1 = np.array([np.random.
-                                                  uniform(low=-1, size=nodes_per_layer) for _ in range(input_size)])
-            self.biases_input_hidden1 = np.random.uniform(low=-1, size=input_size)
+            self.weights_input_hidden1 = rng.uniform(low=-1, size=(input_size, nodes_per_layer))
+            self.biases_input_hidden1 = rng.uniform(low=-1, size=input_size)
 
             # The weights and biases between hidden layer 1 and hidden layer 2
             # Shape: nodes_per_layer x nodes_per_layer == 8x8
-            self.weights_hidden1_hidden2 = np.array([np.random.
-                                                    uniform(low=-1, size=nodes_per_layer) for _ in range(nodes_per_layer)])
-            self.biases_hidden1_hidden2 = np.random.uniform(low=-1, size=self.weights_input_hidden1.shape[1])
+            self.weights_hidden1_hidden2 = rng.uniform(low=-1, size=(nodes_per_layer, nodes_per_layer))
+            self.biases_hidden1_hidden2 = rng.uniform(low=-1, size=self.weights_input_hidden1.shape[1])
 
             # The weights and biases between hidden layer 2 and output layer
             # Shape: nodes_per_layer x output_size == 8x4
-            self.weights_hidden2_output = np.array([np.random.
-                                                   uniform(low=-1, size=output_size) for _ in range(nodes_per_layer)])
-            self.biases_hidden2_output = np.random.uniform(low=-1, size=output_size)
+            self.weights_hidden2_output = rng.uniform(low=-1, size=(nodes_per_layer, output_size))
+            self.biases_hidden2_output = rng.uniform(low=-1, size=output_size)
 
         # Create a brain with existing weights and biases
         else:
@@ -84,6 +176,54 @@ class SnakeBrain:
         # Placeholder for the game of Snake this brain will act upon
         self.game = None
 
+    @classmethod
+    def from_genome(cls, genome, input_size=24, nodes_per_layer=8, output_size=4):
+        """
+        A brain that uses the layers of a genome as its weights and biases, without copying them. Changes to the brain,
+        ie. mutations, are made to the genome.
+        :param genome: Flat array of every weight and bias, see split_genomes
+        :return: SnakeBrain
+        """
+        layers = split_genomes(genome, input_size, nodes_per_layer, output_size)
+        return cls(weights=layers[0::2], biases=layers[1::2])
+
+    @classmethod
+    def load(cls, path, index=0, mmap=False):
+        """
+        Load a brain from a brain file, see brain_file
+        :param path: Path of the brain file
+        :param index: Which of the brains in the file to load
+        :param mmap: Use the weights and biases straight from the file instead of reading them into memory. The brain
+                     is then read only and can't be mutated, which is why it's off by default, a single brain is
+                     quick to read anyway. See PopulationNetwork.load for loading many brains
+        :return: SnakeBrain
+        """
+        genomes, header = brain_file.load(path, mmap)
+        return cls.from_genome(genomes[index], header["input_size"], header["nodes_per_layer"], header["output_size"])
+
+    def sizes(self):
+        """
+        :return: The input_size, nodes_per_layer and output_size of this brain
+        """
+        return (self.weights_input_hidden1.shape[0], self.weights_input_hidden1.shape[1],
+                self.weights_hidden2_output.shape[1])
+
+    def genome(self):
+        """
+        :return: Every weight and bias of this brain in one flat array, see split_genomes
+        """
+        return np.concatenate([np.ravel(getattr(self, layer)) for layer in layer_names])
+
+    def save(self, path, fitness=None, game=None, **metadata):
+        """
+        Save this brain to a brain file, see brain_file
+        :param path: Where to save the brain
+        :param fitness: Optional fitness of the brain
+        :param game: snake_custom.GameConfig of the game the brain plays, snake_custom.default_config() if not given
+        :param metadata: Anything else to keep in the file
+        """
+        brain_file.save(path, self.genome(), fitness, game, self.sizes(), **metadata)
+
     def get_output(self, input_array: np.ndarray):
         """
         Get output from input by feed forwarding it through the network
@@ -115,196 +255,115 @@ class SnakeBrain:
         # The sigmoid function basically just exaggerates the value
         return 1 / (1 + np.exp(x))
 
-    def single_point_crossover(self, second_brain):
+    def single_point_crossover(self, second_brain, rng=None):
         """
         Crossover two brains using single point co, creating a child with a random amount of each it's parents qualities
-        :param second_brain: the brain to crossover with
-        :return: SnakeBrain child of this brain and the second_brain
-        """
-
-        # The weights and biases for the second snake
-        s_w1 = second_brain.weights_input_hidden1
-        s_b1 = second_brain.biases_input_hidden1
-
-        s_w2 = second_brain.weights_hidden1_hidden2
-        s_b2 = second_brain.biases_hidden1_hidden2
-
-        s_w3 = second_brain.weights_hidden2_output
-        s_b3 = second_brain.biases_hidden2_output
-
-        # Childs weights and biases
-
-        c1_w1, c2_w1 = self.__2d_array_sp_crossover(self.weights_input_hidden1, s_w1)
-        c1_b1, c2_b1 = self.__1d_array_sp_crossover(self.biases_input_hidden1, s_b1)
-
-        c1_w2, c2_w2 = self.__2d_array_sp_crossover(self.weights_hidden1_hidden2, s_w2)
-        c1_b2, c2_b2 = self.__1d_array_sp_crossover(self.biases_hidden1_hidden2, s_b2)
-
-        c1_w3, c2_w3 = self.__2d_array_sp_crossover(self.weights_hidden2_output, s_w3)
-        c1_b3, c2_b3 = self.__1d_array_sp_crossover(self.biases_hidden2_output, s_b3)
-
-        child1 = SnakeBrain(weights=[c1_w1, c1_w2, c1_w3], biases=[c1_b1, c1_b2, c1_b3])
-        child2 = SnakeBrain(weights=[c2_w1, c2_w2, c2_w3], biases=[c2_b1, c2_b2, c2_b3])
-
-        return child1, child2
+        Every row of the weights, and every array of biases, is split at its own random point. The children get one
+        parents values before the point and the other parents values after it.
 
-    @staticmethod
-    def __2d_array_sp_crossover(arr1, arr2):
-        """
-        A helper function that crosses over the rows of two arrays at random points
-        :param arr1:
-        :param arr2:
-        :return: a crossover array comprising of the previous two arrays
+        :param second_brain: the brain to crossover with
+        :param rng: numpy Generator to draw the crossover points from
+        :return: SnakeBrain children of this brain and the second_brain
         """
-        tmp = arr1.copy()
-        for i, row in enumerate(arr1):
-            c_p = random.randint(0, len(row))
-            arr1[i][c_p:] = arr2[i][c_p:]
-            arr2[i][c_p:] = tmp[i][c_p:]
-
-        return arr1, arr2
+        return self.__crossover(second_brain, uniform=False, rng=rng)
 
-    @staticmethod
-    def __1d_array_sp_crossover(arr1, arr2):
-        c_p = random.randint(0, len(arr1))
-        tmp = arr1.copy()
-        arr1[c_p:] = arr2[c_p:]
-        arr2[c_p:] = tmp[c_p:]
-        return arr1, arr2
-
-    def uniform_crossover(self, second_brain):
+    def uniform_crossover(self, second_brain, rng=None):
         """
         Crossover two brains, using uniform co, creating a child with a random amount of each it's parents qualities
         Uniform crossover uses a fixed mixing ratio between two parents, in this case 0.5, each elements has a 0.5
         chance of being from one parent or the other.
 
         :param second_brain: the brain to crossover with
+        :param rng: numpy Generator to draw the parent of every value from
         :return: SnakeBrain children of this brain and the second_brain
         """
+        return self.__crossover(second_brain, uniform=True, rng=rng)
 
-        # The weights and biases for the second snake
-        s_w1 = second_brain.weights_input_hidden1
-        s_b1 = second_brain.biases_input_hidden1
-
-        s_w2 = second_brain.weights_hidden1_hidden2
-        s_b2 = second_brain.biases_hidden1_hidden2
-
-        s_w3 = second_brain.weights_hidden2_output
-        s_b3 = second_brain.biases_hidden2_output
-
-        # Childs weights and biases
-
-        c1_w1, c2_w1 = self.__2d_array_un_crossover(self.weights_input_hidden1, s_w1)
-        c1_b1, c2_b1 = self.__1d_array_un_crossover(self.biases_input_hidden1, s_b1)
-
-        c1_w2, c2_w2 = self.__2d_array_un_crossover(self.weights_hidden1_hidden2, s_w2)
-        c1_b2, c2_b2 = self.__1d_array_un_crossover(self.biases_hidden1_hidden2, s_b2)
-
-        c1_w3, c2_w3 = self.__2d_array_un_crossover(self.weights_hidden2_output, s_w3)
-        c1_b3, c2_b3 = self.__1d_array_un_crossover(self.biases_hidden2_output, s_b3)
-
-        child1 = SnakeBrain(weights=[c1_w1, c1_w2, c1_w3], biases=[c1_b1, c1_b2, c1_b3])
-        child2 = SnakeBrain(weights=[c2_w1, c2_w2, c2_w3], biases=[c2_b1, c2_b2, c2_b3])
-
-        return child1, child2
-
-    @staticmethod
-    def __2d_array_un_crossover(arr1, arr2):
+    def __crossover(self, second_brain, uniform, rng):
         """
-        Helper function for performing uniform crossover on 2d arrays
-        :param arr1:
-        :param arr2:
-        :return: the two child arrays
+        Helper function that crosses over every layer with a mask drawn for the whole layer at once, rather than
+        picking a parent for every value in python
+        :return: the two children
         """
-        parents = [arr1, arr2]
-        child1 = []
-        child2 = []
+        child1_layers = []
+        child2_layers = []
 
-        for i, row in enumerate(arr1):
-            tmp_child1 = []
-            tmp_child2 = []
-            for n, _ in enumerate(row):
-                p = random.randint(0, 1)
-                tmp_child1.append(parents[p][i][n])
-                tmp_child2.append(parents[abs(p-1)][i][n])
-            child1.append(tmp_child1)
-            child2.append(tmp_child2)
+        for layer in layer_names:
+            child1_layer, child2_layer = crossover_layer(getattr(self, layer), getattr(second_brain, layer), uniform,
+                                                         rng=rng)
+            child1_layers.append(child1_layer)
+            child2_layers.append(child2_layer)
 
-        return np.array(child1), np.array(child2)
+        # The layers alternate between weights and biases
+        child1 = SnakeBrain(weights=child1_layers[0::2], biases=child1_layers[1::2])
+        child2 = SnakeBrain(weights=child2_layers[0::2], biases=child2_layers[1::2])
 
-    @staticmethod
-    def __1d_array_un_crossover(arr1, arr2):
-        """
-        Helper function for performing uniform crossover on 1d arrays
-        :param arr1:
-        :param arr2:
-        :return: the two child arrays
-        """
-
-        parents = [arr1, arr2]
-        child1 = []
-        child2 = []
-
-        for n, _ in enumerate(arr1):
-            p = random.randint(0, 1)
-            child1.append(parents[p][n])
-            child2.append(parents[abs(p - 1)][n])
-        return np.array(child1), np.array(child2)
+        return child1, child2
 
-    def mutate(self):
+    def mutate(self, rng=None):
         """
         Mutate weights and biases, 2 mutations per row of the arrays by default
+        :param rng: numpy Generator to draw the mutations from
         :return:
         """
-        self.weights_input_hidden1 = self.__2d_array_mutate(self.weights_input_hidden1)
-        self.biases_input_hidden1 = self.__1d_array_mutate(self.biases_input_hidden1)
+        if rng is None:
+            rng = np.random.default_rng()
+
+        self.weights_input_hidden1 = self.__2d_array_mutate(self.weights_input_hidden1, rng)
+        self.biases_input_hidden1 = self.__1d_array_mutate(self.biases_input_hidden1, rng)
 
-        self.weights_hidden1_hidden2 = self.__2d_array_mutate(self.weights_hidden1_hidden2)
-        self.biases_hidden1_hidden2 = self.__1d_array_mutate(self.biases_hidden1_hidden2)
+        self.weights_hidden1_hidden2 = self.__2d_array_mutate(self.weights_hidden1_hidden2, rng)
+        self.biases_hidden1_hidden2 = self.__1d_array_mutate(self.biases_hidden1_hidden2, rng)
 
-        self.weights_hidden2_output = self.__2d_array_mutate(self.weights_hidden2_output)
-        self.biases_hidden2_output = self.__1d_array_mutate(self.biases_hidden2_output)
+        self.weights_hidden2_output = self.__2d_array_mutate(self.weights_hidden2_output, rng)
+        self.biases_hidden2_output = self.__1d_array_mutate(self.biases_hidden2_output, rng)
 
     @staticmethod
-    def __2d_array_mutate(arr1):
+    def __2d_array_mutate(arr1, rng):
         """
         A helper function that mutates
         :return: an array comprising of arr1 but with two random values per row mutated
         """
 
-        for i, row in enumerate(arr1):
-            i_1 = random.randint(0, len(row) - 1)
-            i_2 = random.randint(0, len(row) - 1)
-            arr1[i][i_1] = random.uniform(-1, 1)
-            arr1[i][i_2] = random.uniform(-1, 1)
+        # The two indexes and new values of every row, drawn for all the rows at once
+        rows = np.arange(len(arr1))
+        index = rng.integers(0, arr1.shape[1], (len(arr1), 2))
+        values = rng.uniform(-1, 1, (len(arr1), 2))
+        arr1[rows, index[:, 0]] = values[:, 0]
+        arr1[rows, index[:, 1]] = values[:, 1]
 
         return arr1
 
     @staticmethod
-    def __1d_array_mutate(arr1,):
+    def __1d_array_mutate(arr1, rng):
         """
         A helper function that mutates
         :return: an array comprising of arr1 but with two random values per row mutated
         """
 
-        i_1 = random.randint(0, len(arr1) - 1)
-        i_2 = random.randint(0, len(arr1) - 1)
-        arr1[i_1] = random.uniform(-1, 1)
-        arr1[i_2] = random.uniform(-1, 1)
+        i_1, i_2 = rng.integers(0, len(arr1), 2)
+        value_1, value_2 = rng.uniform(-1, 1, 2)
+        arr1[i_1] = value_1
+        arr1[i_2] = value_2
 
         return arr1
 
-    def play(self, graphical=True, delay: float=0., fruits=True):
+    def play(self, graphical=True, delay: float=0., fruits=True, seed=None, config=None, detect_loops=None):
         """
         Instruct this brain to play a game of snake.
 
         :param graphical: Whether or not to show the game, boosts performance by 70% without it
         :param delay: Optional delay between steps, easier to see what the snake is doing
         :param fruits: Whether or not to spawn fruits
-        :return: Score, age
+        :param seed: Optional seed or numpy Generator for the fruit spawns, to replay the exact same game
+        :param config: Optional snake_custom.GameConfig of the game, snake_custom.default_config() if not given
+        :param detect_loops: Whether to end the game when the snake loops, snake_custom.default_detect_loops if not
+                             given
+        :return: Score, age, and why the game ended, one of snake_custom.terminations
         """
         # The game of 'snake!' that this brain will use
-        self.game = snake_custom.SnakeGame(graphical, fruits)
+        self.game = snake_custom.SnakeGame(graphical, fruits, seed, config, detect_loops)
+        steps = 0
 
         while True:
             # Get what the snake can 'see'
@@ -318,16 +377,256 @@ class SnakeBrain:
 
             # Returns false on snake surviving a game step, score and age on it dying
             result = self.game.step(output)
+            steps += 1
 
             # Game has ended
             if type(result) == tuple:
-                # Retrun score, age
-                return result[0], result[1]
+                # Every step takes one forward pass
+                profiler.count(steps, steps)
+                # Retrun score, age, termination
+                return result[0], result[1], self.game.termination
 
             if delay:
                 sleep(delay)
 
 
+class PopulationNetwork:
+    """
+    The networks of a whole population of SnakeBrains, with every layer stacked into one array:
+        weights: N x 24x8, N x 8x8, N x 8x4
+        biases:  N x 24,   N x 8,   N x 4
+    This lets every brain be fed forward with a single batched matrix multiplication per layer, instead of three small
+    np.dot calls per brain, which is where most of the time went when playing one game at a time.
+    """
+    def __init__(self, weights, biases):
+        """
+        :param weights: List of the stacked weights for each layer
+        :param biases: List of the stacked biases for each layer
+        """
+        self.weights_input_hidden1 = weights[0]
+        self.biases_input_hidden1 = biases[0]
+
+        self.weights_hidden1_hidden2 = weights[1]
+        self.biases_hidden1_hidden2 = biases[1]
+
+        self.weights_hidden2_output = weights[2]
+        self.biases_hidden2_output = biases[2]
+
+    @classmethod
+    def from_brains(cls, brains):
+        """
+        Stack the weights and biases of a list of brains
+        :param brains: The SnakeBrains to stack, their order is kept
+        :return: PopulationNetwork of the brains
+        """
+        weights = [np.stack([brain.weights_input_hidden1 for brain in brains]),
+                   np.stack([brain.weights_hidden1_hidden2 for brain in brains]),
+                   np.stack([brain.weights_hidden2_output for brain in brains])]
+        biases = [np.stack([brain.biases_input_hidden1 for brain in brains]),
+                  np.stack([brain.biases_hidden1_hidden2 for brain in brains]),
+                  np.stack([brain.biases_hidden2_output for brain in brains])]
+
+        return cls(weights, biases)
+
+    @classmethod
+    def from_genomes(cls, genomes, input_size=24, nodes_per_layer=8, output_size=4):
+        """
+        A network that uses the layers of a (N, genome length) array of genomes, without copying them. Crossing over
+        into, or mutating, the network writes straight into the genomes.
+        :param genomes: Array of one genome per brain, see split_genomes
+        :return: PopulationNetwork of the genomes
+        """
+        layers = split_genomes(genomes, input_size, nodes_per_layer, output_size)
+        return cls(weights=layers[0::2], biases=layers[1::2])
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load every brain of a brain file, ie. to let a collection of saved snakes play with PopulationNetwork.play
+        :param path: Path of the brain file
+        :param mmap: Use the weights and biases straight from the file, read only, instead of reading them into memory
+        :return: PopulationNetwork
+        """
+        genomes, header = brain_file.load(path, mmap)
+        return cls.from_genomes(genomes, header["input_size"], header["nodes_per_layer"], header["output_size"])
+
+    @classmethod
+    def empty(cls, size, input_size=24, nodes_per_layer=8, output_size=4):
+        """
+        Allocate the arrays for a population without filling them in, ie. to crossover children into
+        :param size: How many brains the network is for
+        :return: PopulationNetwork with uninitialized weights and biases
+        """
+        weights = [np.empty((size, input_size, nodes_per_layer)),
+                   np.empty((size, nodes_per_layer, nodes_per_layer)),
+                   np.empty((size, nodes_per_layer, output_size))]
+        biases = [np.empty((size, input_size)),
+                  np.empty((size, nodes_per_layer)),
+                  np.empty((size, output_size))]
+
+        return cls(weights, biases)
+
+    def to_brains(self):
+        """
+        Split the stacked arrays back up into separate brains, the brains get their own copies of the arrays
+        :return: List of SnakeBrains, in the same order as they were stacked
+        """
+        return [SnakeBrain(weights=[self.weights_input_hidden1[i].copy(),
+                                    self.weights_hidden1_hidden2[i].copy(),
+                                    self.weights_hidden2_output[i].copy()],
+                           biases=[self.biases_input_hidden1[i].copy(),
+                                   self.biases_hidden1_hidden2[i].copy(),
+                                   self.biases_hidden2_output[i].copy()])
+                for i in range(len(self))]
+
+    def __len__(self):
+        return self.weights_input_hidden1.shape[0]
+
+    def __getitem__(self, index):
+        """
+        :param index: A slice or an array of indexes of the brains to get
+        :return: PopulationNetwork of only those brains
+        """
+        return PopulationNetwork(weights=[self.weights_input_hidden1[index],
+                                          self.weights_hidden1_hidden2[index],
+                                          self.weights_hidden2_output[index]],
+                                 biases=[self.biases_input_hidden1[index],
+                                         self.biases_hidden1_hidden2[index],
+                                         self.biases_hidden2_output[index]])
+
+    def get_output(self, input_array: np.ndarray):
+        """
+        Feed forward one input per brain, the same way SnakeBrain.get_output does
+
+        :param input_array: The inputs, of the shape N x 24
+        :return: An output array with 4 values per brain, of the shape N x 4
+        """
+        # Add biases then multiply by weights, input => h_layer_1, just like SnakeBrain.get_output
+        h_layer_1_b = input_array + self.biases_input_hidden1
+        h_layer_1_w = np.matmul(h_layer_1_b[:, np.newaxis], self.weights_input_hidden1)[:, 0]
+        h_layer_1 = SnakeBrain.sigmoid(h_layer_1_w)
+
+        # Multiply by weights then add biases, h_layer_1 => h_layer_2
+        h_layer_2_w = np.matmul(h_layer_1[:, np.newaxis], self.weights_hidden1_hidden2)[:, 0]
+        h_layer_2_b = h_layer_2_w + self.biases_hidden1_hidden2
+        h_layer_2 = SnakeBrain.sigmoid(h_layer_2_b)
+
+        # Multiply by weights then add biases, h_layer_2 => output
+        output_w = np.matmul(h_layer_2[:, np.newaxis], self.weights_hidden2_output)[:, 0]
+        output_b = output_w + self.biases_hidden2_output
+
+        return SnakeBrain.sigmoid(output_b)
+
+    def play(self, fruits=True, seeds=None, brains=None, config=None, detect_loops=None):
+        """
+        Let every brain play its own game of snake, all the games are played at once with a BatchSnakeGame.
+
+        :param fruits: Whether or not to spawn fruits
+        :param seeds: Optional seed, SeedSequence or Generator for every game, a brain scores the same as with
+                      SnakeBrain.play(seed=seed)
+        :param brains: Optional array of which brain plays each game, a brain may play any number of games. By default
+                       every brain plays one game, in order
+        :param config: Optional snake_custom.GameConfig of every game, snake_custom.default_config() if not given
+        :param detect_loops: Whether to end games that loop, snake_custom.default_detect_loops if not given
+        :return: Arrays of the scores, ages and terminations of every game, the terminations are indexes into
+                 snake_custom.terminations
+        """
+        # The brains of the games that are still playing, gathered again only when a game ends, as that copies their
+        # layers. Games never come back to life, so they only change when fewer are alive
+        if brains is None:
+            brains = np.arange(len(self))
+            playing = self
+        else:
+            playing = self[brains]
+        game = snake_batch.BatchSnakeGame(len(brains), fruits, seeds, config, detect_loops)
+        output = np.zeros(len(brains), dtype=np.intp)
+        steps = 0
+
+        while game.alive.any():
+            # Only the brains that are still playing need to think
+            alive = np.flatnonzero(game.alive)
+            steps += len(alive)
+            if len(alive) != len(playing):
+                playing = self[brains[alive]]
+            input_from_game = game.look(alive)
+
+            # index: 0 => North, 1 => East, 2 => South, 3 => West
+            output[alive] = np.argmax(playing.get_output(input_from_game), axis=1)
+
+            game.step(output)
+
+        # Every step of every game takes one forward pass of its brain
+        profiler.count(steps, steps)
+        return game.score, game.age, game.termination
+
+
+def crossover_batch(parents_a, parents_b, uniform=True, out=None, rng=None):
+    """
+    Crossover a whole generation at once, every brain in parents_a is crossed over with the brain at the same index in
+    parents_b, exactly like SnakeBrain.uniform_crossover and SnakeBrain.single_point_crossover do.
+
+    :param parents_a: PopulationNetwork of the first parent of each crossover
+    :param parents_b: PopulationNetwork of the second parent of each crossover
+    :param uniform: Uniform crossover if True, single point crossover if False
+    :param out: Optional pair of preallocated PopulationNetworks to write the children into, ie. from
+                PopulationNetwork.empty. They must not share memory with the parents
+    :param rng: numpy Generator to draw the crossovers from
+    :return: PopulationNetworks of the first and second child of each crossover
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    if out is None:
+        out = PopulationNetwork.empty(len(parents_a)), PopulationNetwork.empty(len(parents_a))
+    children_a, children_b = out
+
+    for layer in layer_names:
+        crossover_layer(getattr(parents_a, layer), getattr(parents_b, layer), uniform,
+                        out1=getattr(children_a, layer), out2=getattr(children_b, layer), rng=rng)
+
+    return children_a, children_b
+
+
+def mutate_batch(network, rate, gaussian=True, scales=1., rng=None):
+    """
+    Mutate a whole population in place, every weight and bias has the same chance to mutate. Which values mutate, and
+    what they mutate to, is drawn for a whole layer at a time.
+
+    :param network: PopulationNetwork to mutate
+    :param rate: The chance for each value to mutate, between 0 and 1
+    :param gaussian: Add normally distributed noise if True, or replace with a uniformly random value if False
+    :param scales: The size of the mutations, for all layers or a list with one for each of layer_names. The standard
+                   deviation of the noise if gaussian, otherwise new values are drawn between -scale and scale. A
+                   scale of 1 resets values to the same range new brains are made with, a smaller one pulls the
+                   mutated values towards 0
+    :param rng: numpy Generator to draw the mutations from
+    :return: How many values were mutated in each brain
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    if np.ndim(scales) == 0:
+        scales = [scales] * len(layer_names)
+
+    mutated = np.zeros(len(network), dtype=np.int64)
+
+    for layer, scale in zip(layer_names, scales):
+        arr = getattr(network, layer)
+
+        # Rather than drawing a chance for every value, draw how many values mutate and then which ones. This gives the
+        # same distribution, but only draws as many random numbers as there are mutations
+        n_mutations = rng.binomial(arr.size, rate)
+        flat_index = rng.choice(arr.size, n_mutations, replace=False)
+        index = np.unravel_index(flat_index, arr.shape)
+
+        if gaussian:
+            arr[index] += rng.normal(0, scale, n_mutations)
+        else:
+            arr[index] = rng.uniform(-scale, scale, n_mutations)
+
+        mutated += np.bincount(index[0], minlength=len(network))
+
+    return mutated
+
+
 if __name__ == '__main__':
     # for testing
     while True:
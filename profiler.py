@@ -0,0 +1,156 @@
+import cProfile
+import json
+import sys
+from time import perf_counter, time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, the peak memory is left out there
+    resource = None
+
+"""
+Comments:
+profiler times the stages of every generation of the GA, and counts the game steps and forward passes done in them.
+Every generation is written as one JSON object per line to a file, ie.
+    {"generation": 3, "time": 1.93, "stages": {"fitness": 1.71, "rank": 0.01, ...}, "steps": 2512300,
+     "forward_passes": 2512300, "steps_per_second": 1469182.1, "forward_passes_per_second": 1469182.1,
+     "peak_rss_mb": 412.5, ...}
+which can be read with ie. pandas.read_json(path, lines=True).
+
+A stage is timed as the time since the last stage ended, so marking one is a single call after it, and a profiler
+that's turned off returns from it straight away. The counters are added to by the game loops of neural_network, once per
+batch of games or per game, they are kept per process so the workers of the GA send theirs back with the scores.
+
+A single generation can also be run under cProfile, its stats are saved to a file that can be read with pstats or ie.
+snakeviz. Only the main process is profiled, not the games played in worker processes.
+
+Requirements: resource for the peak memory, which is only available on Unix
+"""
+
+# What has been done since the counters were last taken, see count and take_counters
+counters = {"steps": 0, "forward_passes": 0}
+
+
+def count(steps, forward_passes):
+    """
+    Add to the counters of this process
+    :param steps: How many game steps were simulated, one per step of every game
+    :param forward_passes: How many times a brain was fed forward
+    """
+    counters["steps"] += steps
+    counters["forward_passes"] += forward_passes
+
+
+def take_counters():
+    """
+    :return: Dict of the counters since they were last taken, they start over at zero
+    """
+    taken = dict(counters)
+    for name in counters:
+        counters[name] = 0
+    return taken
+
+
+def add_counters(taken):
+    """
+    Add counters taken in another process, ie. a worker, to the counters of this one
+    """
+    count(taken["steps"], taken["forward_passes"])
+
+
+def peak_rss_mb():
+    """
+    :return: The most memory this process has used at once, in MB, or None if it can't be known
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes everywhere else
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+class GenerationProfiler:
+    """
+    Usage, once per generation:
+        profiler.start(generation)
+        ...
+        profiler.lap("selection")
+        ...
+        profiler.finish(population=len(pop))
+    """
+    def __init__(self, path=None, cprofile_generation=None, cprofile_path="profile_generation_{}.prof"):
+        """
+        :param path: File to append a JSON line to for every generation, None turns the timings off
+        :param cprofile_generation: Optional generation to run cProfile over
+        :param cprofile_path: Where to save the cProfile stats, formatted with the generation
+        """
+        self.file = open(path, "a") if path else None
+        self.cprofile_generation = cprofile_generation
+        self.cprofile_path = cprofile_path
+
+        self.generation = None
+        self.stages = {}
+        self.cprofile = None
+        self.started = 0.
+        self.last_lap = 0.
+
+    def start(self, generation):
+        """
+        Start timing a generation, the counters start over from here
+        """
+        self.generation = generation
+        if generation == self.cprofile_generation:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        if self.file is None:
+            return
+
+        self.stages = {}
+        take_counters()
+        self.started = self.last_lap = perf_counter()
+
+    def lap(self, stage):
+        """
+        End a stage, everything since the last stage ended, or the generation started, is timed as it. A stage can be
+        ended more than once a generation, the times are added up
+        :param stage: Name of the stage
+        """
+        if self.file is None:
+            return
+
+        now = perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.) + now - self.last_lap
+        self.last_lap = now
+
+    def finish(self, **extra):
+        """
+        End the generation and write its line
+        :param extra: Anything else to put in the line, has to be JSON serializable
+        """
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.cprofile_path.format(self.generation))
+            self.cprofile = None
+        if self.file is None:
+            return
+
+        elapsed = perf_counter() - self.started
+        taken = take_counters()
+        # The steps and forward passes are all done while playing the games
+        playing = self.stages.get("fitness", 0.)
+
+        line = {"generation": self.generation,
+                "timestamp": time(),
+                "time": elapsed,
+                "stages": self.stages,
+                "steps": taken["steps"],
+                "forward_passes": taken["forward_passes"],
+                "steps_per_second": taken["steps"] / playing if playing else None,
+                "forward_passes_per_second": taken["forward_passes"] / playing if playing else None,
+                "peak_rss_mb": peak_rss_mb()}
+        line.update(extra)
+
+        self.file.write(json.dumps(line) + "\n")
+        self.file.flush()
+
@@ -0,0 +1,288 @@
+import numpy as np
+import snake_custom
+
+"""
+Comments:
+snake_batch is the snake game from snake_custom, but played as many games at once. All the boards are held in a single
+(n, height, width) array and every game that is still alive is advanced by one vectorized call to step(), instead of
+one python call per game.
+
+The rules are the same as in snake_custom.SnakeGame: wall and self collision, fruits that make the snake grow, the
+max_steps counter that starves the snake, and score/age being returned when a snake dies. Given the same seeds and
+inputs every game plays out exactly like it would in a SnakeGame.
+
+cell : A coordinate packed into a single index of a flattened board, cell = y*width + x
+
+The cells that every snake isn't on are kept like snake_custom.FreeCells, as a row of free cells per game with the number
+of them and where every cell is in the row. Freeing the tails and taking the heads is done for every game at once, in
+the same order as a Snake does it, so the rows stay the same as in a SnakeGame and a fruit is the same single draw.
+
+With detect_loops a game ends as soon as its snake is back in a state it has already been in since it last
+ate, like SnakeGame does. Keeping every state of 50k games isn't an option, so each game only keeps one saved state that
+is moved forward at steps 1, 2, 4, 8... after the last fruit (Brent's cycle detection), which finds any loop within two
+laps of it. The body is compared through a hash of its cells from tail to head, which is updated as the head is pushed
+and the tail popped, so it never has to go through the body.
+
+Requirements: numpy
+"""
+
+# Direction indexes used by the NN, 0 : NORTH, 1 : EAST, 2 : SOUTH, 3 : WEST, and their movement in X, Y
+directions = [snake_custom.NORTH, snake_custom.EAST, snake_custom.SOUTH, snake_custom.WEST]
+dir_x = np.array([0, 1, 0, -1])
+dir_y = np.array([-1, 0, 1, 0])
+
+# The base of the body hash, the hash of a body is the sum of (cell+1) * hash_base**i from the tail. Any odd number has an
+# inverse modulo 2**64, which uint64 arithmetic wraps around at, the inverse is used to shift the hash back to the tail
+hash_base = np.uint64(0x9E3779B97F4A7C15)
+hash_base_inverse = np.uint64(pow(int(hash_base), -1, 2**64))
+
+# Why a game ended, as indexes into snake_custom.terminations
+COLLIDED = snake_custom.terminations.index("collided")
+STARVED = snake_custom.terminations.index("starved")
+LOOPED = snake_custom.terminations.index("looped")
+WON = snake_custom.terminations.index("won")
+
+
+class BatchSnakeGame:
+    def __init__(self, n, fruits=True, seeds=None, config=None, detect_loops=None):
+        """
+        Start n games of snake
+
+        :param n: How many games to play at once
+        :param fruits: Whether or not to spawn fruits
+        :param seeds: One seed, SeedSequence or numpy Generator per game for the fruit spawns, a game has the same
+                      fruits as a SnakeGame with its seed
+        :param config: The snake_custom.GameConfig of every game, snake_custom.default_config() if not given
+        :param detect_loops: Whether to end games that loop, see the comments at the top,
+                             snake_custom.default_detect_loops if not given
+        """
+        if config is None:
+            config = snake_custom.default_config()
+        self.config = config
+        self.n = n
+        self.width = config.width
+        self.height = config.height
+        self.max_steps = config.max_steps
+        self.detect_loops = detect_loops if detect_loops is not None else snake_custom.default_detect_loops
+
+        # 0: Nothing on tile, 1: snake, 2: fruit, same as the world of a SnakeGame
+        self.boards = np.zeros((n, self.height, self.width), dtype=np.int8)
+        # The same boards, but flattened so that they can be indexed with cells
+        self.cells = self.boards.reshape(n, -1)
+
+        # The snakes bodies are kept as ring buffers of cells, the head is at head_index and the tail length-1 behind it
+        self.ring_size = self.width * self.height + 1
+        self.body = np.zeros((n, self.ring_size), dtype=np.intp)
+        self.head_index = np.zeros(n, dtype=np.intp)
+        self.length = np.zeros(n, dtype=np.intp)
+        # How many moves the tail should stay in place for, after eating a fruit
+        self.growing = np.zeros(n, dtype=np.intp)
+        self.direction = np.full(n, directions.index(config.snake_spawn_direction), dtype=np.intp)
+
+        self.score = np.zeros(n, dtype=np.int64)
+        self.age = np.zeros(n, dtype=np.int64)
+        self.steps_left = np.full(n, self.max_steps, dtype=np.int64)
+        self.alive = np.ones(n, dtype=bool)
+        # Why every game ended, 0 for games that are still playing, see snake_custom.terminations
+        self.termination = np.zeros(n, dtype=np.int8)
+
+        # Spawn the snakes, the same way the Snake class does, the head is placed last in the ring
+        spawn, free, free_index = snake_custom.spawn_layout(config)
+        self.body[:, :len(spawn)] = spawn
+        self.cells[:, spawn] = 1
+        self.head_index[:] = len(spawn) - 1
+        self.length[:] = len(spawn)
+
+        # The free cells of every game, see the comments at the top. The smallest type that holds a cell, as there's
+        # two of these the size of the boards
+        cell_type = np.int16 if self.width * self.height < 2**15 else np.int32
+        self.free = np.zeros((n, self.width * self.height), dtype=cell_type)
+        self.free[:, :len(free)] = free
+        self.free_index = np.tile(free_index.astype(cell_type), (n, 1))
+        self.free_count = np.full(n, len(free), dtype=np.intp)
+
+        if self.detect_loops:
+            # The body hash, without being shifted back to the tail, and hash_base to the power of where the head and
+            # tail were pushed, counting from the first spawned part. tail_inverse shifts the hash back to the tail
+            self.body_hash = np.zeros(n, dtype=np.uint64)
+            self.head_power = np.ones(n, dtype=np.uint64)
+            self.tail_power = np.ones(n, dtype=np.uint64)
+            self.tail_inverse = np.ones(n, dtype=np.uint64)
+            for i in range(len(spawn)):
+                if i:
+                    self.head_power *= hash_base
+                self.body_hash += (self.body[:, i] + 1).astype(np.uint64) * self.head_power
+
+            # The saved state every game is compared to, and how many steps until it's moved forward again
+            self.saved_hash = self.body_hash.copy()
+            self.saved_direction = self.direction.copy()
+            self.saved_growing = self.growing.copy()
+            self.saved_length = self.length.copy()
+            self.loop_power = np.ones(n, dtype=np.int64)
+            self.loop_steps = np.zeros(n, dtype=np.int64)
+
+        # Every game gets its own generator, so that its fruits are the same as in a SnakeGame with the same seed
+        if seeds is None:
+            seeds = [None] * n
+        self.rngs = [np.random.default_rng(seed) for seed in seeds]
+
+        self.fruits = fruits
+        if fruits:
+            for g in range(n):
+                self.spawn_fruit(g)
+
+    def spawn_fruit(self, g):
+        """
+        Spawn a fruit on a random tile that the snake in game g is not occupying, drawn the same way Fruit does
+        :param g: The index of the game, which has to have a free cell
+        """
+        cell = self.free[g, int(self.rngs[g].integers(0, self.free_count[g]))]
+        self.cells[g, cell] = 2
+
+    def add_free(self, g, cells):
+        """
+        FreeCells.add for one cell in each of the games g
+        """
+        count = self.free_count[g]
+        self.free[g, count] = cells
+        self.free_index[g, cells] = count
+        self.free_count[g] += 1
+
+    def remove_free(self, g, cells):
+        """
+        FreeCells.remove for one cell in each of the games g, the last free cell of a game takes the place of its cell
+        """
+        index = self.free_index[g, cells]
+        self.free_count[g] -= 1
+        last = self.free[g, self.free_count[g]]
+        self.free[g, index] = last
+        self.free_index[g, last] = index
+
+    def look(self, games=None):
+        """
+        Snake.look for many games at once, see Snake.look for what the values mean.
+
+        :param games: Optional array of the indexes of the games to look for, ie. the ones that are still alive. All
+                      the games are looked at if not given, what dead games see is meaningless though
+        :return: A (len(games), 24) array of what every snake can see
+        """
+        if games is None:
+            games = np.arange(self.n)
+
+        return snake_custom.look_along_rays(self.cells[games], self.body[games, self.head_index[games]],
+                                            self.width, self.height)
+
+    def step(self, direction):
+        """
+        Advance every game that is still alive by one step, games that are dead are left untouched.
+
+        :param direction: An array with the NN's input for every game, 0 : NORTH, 1 : EAST, 2 : SOUTH, 3 : WEST
+        :return: A boolean array of the games that ended on this step, their score and age are in self.score, self.age
+        """
+        g = np.flatnonzero(self.alive)
+        direction = np.asarray(direction)[g]
+
+        # Let the NN try to go into itself, like Snake.change_direction, turning back the way it came is ignored
+        turn_back = direction == (self.direction[g] + 2) % 4
+        self.direction[g] = np.where(turn_back, self.direction[g], direction)
+        drct = self.direction[g]
+
+        head = self.body[g, self.head_index[g]]
+        x = head % self.width + dir_x[drct]
+        y = head // self.width + dir_y[drct]
+
+        # Move the tail, unless the snake is growing from a fruit in which case the tail stays where it is
+        growing = self.growing[g] > 0
+        moving = g[~growing]
+        tail = self.body[moving, (self.head_index[moving] - self.length[moving] + 1) % self.ring_size]
+        self.cells[moving, tail] = 0
+        self.add_free(moving, tail)
+        if self.detect_loops:
+            self.body_hash[moving] -= (tail + 1).astype(np.uint64) * self.tail_power[moving]
+            self.tail_power[moving] *= hash_base
+            self.tail_inverse[moving] *= hash_base_inverse
+        self.growing[g[growing]] -= 1
+        self.length[g[growing]] += 1
+
+        # Check if the head collided with anything
+        in_bounds = (0 <= x) & (x < self.width) & (0 <= y) & (y < self.height)
+        cell = np.where(in_bounds, y * self.width + x, 0)
+        tile = np.where(in_bounds, self.cells[g, cell], 0)
+
+        ate = in_bounds & (tile == 2)
+        died = ~in_bounds | (tile == 1) | (self.steps_left[g] == 0)
+
+        ended = np.zeros(self.n, dtype=bool)
+        ended[g[died]] = True
+        self.alive[g[died]] = False
+        self.termination[g[died]] = np.where(in_bounds[died] & (tile[died] != 1), STARVED, COLLIDED)
+
+        # Snake survived
+        survived = ~died
+        g, cell, ate = g[survived], cell[survived], ate[survived]
+
+        self.head_index[g] = (self.head_index[g] + 1) % self.ring_size
+        self.body[g, self.head_index[g]] = cell
+        self.cells[g, cell] = 1
+        self.remove_free(g, cell)
+        if self.detect_loops:
+            self.head_power[g] *= hash_base
+            self.body_hash[g] += (cell + 1).astype(np.uint64) * self.head_power[g]
+
+        # Snakes that ate a fruit grow on their next move, and get a new fruit and step counter
+        fed = g[ate]
+        self.growing[fed] += 1
+        self.score[fed] += 1
+        self.steps_left[fed] = self.max_steps
+
+        # A snake that fills the whole board has won, there's nowhere left for a fruit
+        won = fed[self.free_count[fed] == 0]
+        ended[won] = True
+        self.alive[won] = False
+        self.termination[won] = WON
+        for f in fed[self.free_count[fed] > 0]:
+            self.spawn_fruit(f)
+
+        self.steps_left[g] -= 1
+        self.age[g] += 1
+
+        if self.detect_loops:
+            self.end_loops(g, ate, ended)
+
+        return ended
+
+    def end_loops(self, g, ate, ended):
+        """
+        End the games that are back in their saved state, they would go around the same loop until they starve.
+        Their age is set to the age they would have starved at. Then move the saved states forward, see the comments at
+        the top.
+
+        :param g: The games that survived this step
+        :param ate: Which of the games in g ate a fruit this step, their loop checking starts over from this step
+        :param ended: The games that ended this step, the looping games are added to it
+        """
+        state_hash = self.body_hash[g] * self.tail_inverse[g]
+        looped = ((state_hash == self.saved_hash[g]) & (self.direction[g] == self.saved_direction[g]) &
+                  (self.growing[g] == self.saved_growing[g]) & (self.length[g] == self.saved_length[g]))
+
+        # A game that just ate is in a new world, so it can't have been in this state before
+        self.loop_steps[g] += 1
+        looped &= ~ate
+
+        looping = g[looped]
+        ended[looping] = True
+        self.alive[looping] = False
+        self.termination[looping] = LOOPED
+        self.age[looping] += self.steps_left[looping]
+        self.steps_left[looping] = 0
+
+        # Save the state of the games that just ate, or have gone loop_power steps since it was last saved
+        save = ate | ~looped & (self.loop_steps[g] >= self.loop_power[g])
+        saving = g[save]
+        self.saved_hash[saving] = state_hash[save]
+        self.saved_direction[saving] = self.direction[saving]
+        self.saved_growing[saving] = self.growing[saving]
+        self.saved_length[saving] = self.length[saving]
+        self.loop_power[saving] *= 2
+        self.loop_power[g[ate]] = 1
+        self.loop_steps[saving] = 0
@@ -1,21 +1,38 @@
-import pygame as pg
 import numpy as np
-from pygame.locals import *
 from sys import exit as kill_everything
-from random import randrange
+from collections import deque
+from dataclasses import dataclass, field, fields
+from itertools import islice
+from functools import lru_cache
+from numbers import Integral
 
 """
 Comments: 
 snake_custom is the snake game but with adaptions to make it easier to use with the NN
 
 coordinate (coord)  : Position on the grid, ie. x=5, y=5 => (5, 5)
+cell                : A coordinate packed into a single index of the flattened world, cell = y*width + x
 position (pos)      : Position on the board in pixels, calculated with coord*tilesize, ie x=5, y=5 => (200, 200)
 
+The game itself only works with cells, the snake's parts and fruits are kept as cells and the world is a flat list of
+every cell. Pixels are only worked out when drawing, see cell_to_pixels.
+
+The cells the snake isn't on are also kept in a FreeCells, which the snake updates as it moves, so a fruit is spawned
+with a single draw however long the snake is. A snake that fills the whole board has won, as there's nowhere left to
+spawn a fruit.
+
 Anything annoted with 'NN:' was added to adapt the game for the neural network.
 
-Requirements: pygame, numpy, a pc from at least 1657, anything older may not be able to run at 5 fps
+The board size, spawn and max_steps of a game come from a GameConfig. The globals below are the config of games that
+aren't given one, see default_config, so a game of another size doesn't need any of them changed.
+
+Requirements: numpy, pygame for graphics, a pc from at least 1657, anything older may not be able to run at 5 fps
 """
 
+# pygame is only imported by init_pg, when the game is drawn. The game itself runs without it, which saves every NN
+# process from importing pygame and starting SDL when it never shows a game.
+pg = None
+
 
 # Dimensions of board/tileset, prefeably an odd number
 width = 9
@@ -37,17 +54,17 @@ EAST = 0
 SOUTH = 270
 WEST = 180
 
-# Distance between each part when facing a direction in X, Y. This is the delta of movement in a direction.
-offsets = {NORTH: (0, -tilesize),
-           EAST: (tilesize, 0),
-           SOUTH: (0, tilesize),
-           WEST: (-tilesize, 0)}
+# Tiles between each part when facing a direction in X, Y. This is the delta of movement in a direction.
+moves = {NORTH: (0, -1),
+         EAST: (1, 0),
+         SOUTH: (0, 1),
+         WEST: (-1, 0)}
 
-# Alternative directional keys
-k_up_a = K_w
-k_down_a = K_s
-k_right_a = K_d
-k_left_a = K_a
+# Alternative directional keys, the same values as pygame's K_w, K_s, K_d and K_a
+k_up_a = ord("w")
+k_down_a = ord("s")
+k_right_a = ord("d")
+k_left_a = ord("a")
 
 # Start variables for the snake. The Snake class does have its own defaults but these exist for easy adjustments
 snake_spawn_length = 5
@@ -58,33 +75,313 @@ snake_spawn_coord = (width // 2, height // 2)  # Center of board
 # Max steps a snake can take without getting a fruit before dying
 max_steps = 300
 
+# NN:
+# End a game as soon as the snake provably goes in circles, instead of playing on until it starves after max_steps. The
+# age is set to the age the snake would have starved at, so the score and age are the same as without it. This is the
+# default of games that aren't told whether to, see SnakeGame
+default_detect_loops = False
+
+# NN:
+# Why a game ended, BatchSnakeGame keeps these as the index into this list
+terminations = [None, "collided", "starved", "looped", "won"]
+
 # The target fps, i am not taking into account deltatime with my movement, because even a toaster can run this
 # at 6 frames a second. If I had a more demanging game you could account for unstable fps with:
 # movement = move_step * deltatime
 target_fps = 6
 """
 NN:
-A global coordinate system for the snake and fruits, used by the neural network to quickly check for collision in a
-direction;
+Every game has a world, a coordinate system for the snake and fruits, used by the neural network to quickly check for
+collision in a direction. It is a flat list indexed by cell, world[y*width + x];
 0: Nothing on tile
 1: snake
 2: fruit
+The world is owned by the game and handed to its snake and fruits, so that several games can be played side by side.
 """
 
-world = np.zeros((width, height))
+
+@dataclass(frozen=True)
+class GameConfig:
+    """
+    NN:
+    Everything about a game that isn't random, the same as the globals of the same names. It can't be changed, and
+    equal configs are equal as keys, so everything precomputed for a game is cached per config, see spawn_layout and
+    ray_tables. The tilesize only changes how the game is drawn, so it's left out of comparing configs.
+    """
+    width: int = 9
+    height: int = 9
+    max_steps: int = 300
+    snake_spawn_length: int = 5
+    snake_spawn_direction: int = EAST
+    # The center of the board if not given
+    snake_spawn_coord: tuple = None
+    tilesize: int = field(default=40, compare=False)
+
+    def __post_init__(self):
+        if self.snake_spawn_coord is None:
+            object.__setattr__(self, "snake_spawn_coord", (self.width // 2, self.height // 2))
+        else:
+            object.__setattr__(self, "snake_spawn_coord", tuple(self.snake_spawn_coord))
+
+        # The southwest ray of look() is the transposed diagonal, see ray_tables, which is only on a square board
+        if self.width != self.height:
+            raise ValueError("The board has to be square, the snakes can't see on a {}x{} board"
+                             .format(self.width, self.height))
+        # Both engines count the steps left down in ints, so there's no unlimited, just a large number of steps
+        if not isinstance(self.max_steps, Integral) or isinstance(self.max_steps, bool) or self.max_steps <= 0:
+            raise ValueError("max_steps has to be a positive int, not {!r}".format(self.max_steps))
+        if self.snake_spawn_direction not in moves:
+            raise ValueError("snake_spawn_direction has to be one of NORTH, EAST, SOUTH, WEST, not {}"
+                             .format(self.snake_spawn_direction))
+        # The tail is snake_spawn_length-1 tiles behind the head, both have to be on the board
+        x, y = self.snake_spawn_coord
+        move_x, move_y = moves[self.snake_spawn_direction]
+        tail_x, tail_y = x - move_x * (self.snake_spawn_length - 1), y - move_y * (self.snake_spawn_length - 1)
+        if not (self.snake_spawn_length > 0 and 0 <= min(x, tail_x) and max(x, tail_x) < self.width and
+                0 <= min(y, tail_y) and max(y, tail_y) < self.height):
+            raise ValueError("A snake of length {} spawned at {} doesn't fit on a {}x{} board"
+                             .format(self.snake_spawn_length, self.snake_spawn_coord, self.width, self.height))
+
+    @classmethod
+    def from_dict(cls, settings):
+        """
+        :param settings: Dict of settings, ie. from dataclasses.asdict or JSON, anything that isn't a setting is ignored
+        :return: The GameConfig of the settings, with the defaults for the ones that are missing
+        """
+        names = {setting.name for setting in fields(cls)}
+        return cls(**{name: value for name, value in settings.items() if name in names})
+
+
+def default_config():
+    """
+    :return: GameConfig of the globals of this module, used by games that aren't given a config
+    """
+    return GameConfig(width=width, height=height, max_steps=max_steps, snake_spawn_length=snake_spawn_length,
+                      snake_spawn_direction=snake_spawn_direction, snake_spawn_coord=snake_spawn_coord,
+                      tilesize=tilesize)
+
+
+@lru_cache(maxsize=None)
+def spawn_layout(config):
+    """
+    NN:
+    Where every snake of a config spawns, the same for every game of it so only worked out once per config.
+    :return: body: The cells of the spawned snake, from its tail to its head, see ray_tables for cells
+             free: Every other cell of the board, in order
+             free_index: Where every cell is in free, -1 for the cells of the body, see FreeCells
+    """
+    x, y = config.snake_spawn_coord
+    move_x, move_y = moves[config.snake_spawn_direction]
+    # Parts are placed opposite to the direction the snake is facing
+    body = np.array([(y - move_y * i) * config.width + x - move_x * i
+                     for i in reversed(range(config.snake_spawn_length))], dtype=np.intp)
+    free = np.setdiff1d(np.arange(config.width * config.height), body)
+    free_index = np.full(config.width * config.height, -1, dtype=np.intp)
+    free_index[free] = np.arange(len(free))
+
+    body.flags.writeable = False
+    free.flags.writeable = False
+    free_index.flags.writeable = False
+    return body, free, free_index
+
+
+@lru_cache(maxsize=None)
+def ray_tables(b_width, b_height):
+    """
+    NN:
+    Precompute the tiles the snake looks at in each of its 8 directions, for every tile its head can be on. Tiles are
+    packed into a single index of the flattened world, cell = y*width + x. Only done once per board size, which is
+    shared by every GameConfig of that size.
+
+    The rays and distances to the wall are the same as the original look() that walked every ray in python, including
+    how it worked out the diagonals, so the snakes see exactly what they used to. The southwest ray looks along the
+    transposed diagonal, as the original did.
+
+    :return: rays: (cells, 8, length) the cell of each step along a ray, padded with 0
+             valid: (cells, 8, length) False where a ray is padded
+             walls: (cells, 8) the distance to the wall along each ray
+    """
+    length = max(b_width, b_height) - 1
+    rays = np.zeros((b_width * b_height, 8, length), dtype=np.intp)
+    valid = np.zeros((b_width * b_height, 8, length), dtype=bool)
+    walls = np.zeros((b_width * b_height, 8), dtype=np.intp)
+
+    for y in range(b_height):
+        for x in range(b_width):
+            # Convectional x and y, with 0, 0 in the bootom left
+            c_x = y + 1
+            c_y = b_height - x
+
+            # The distance to the edge northwest and southeast, this took a while to get right
+            if c_x + c_y <= b_width + 1:
+                nw_r = c_x - 1
+            else:
+                nw_r = b_height - c_y
+
+            if c_x + c_y < b_width + 1:
+                se_r = c_y - 1
+            else:
+                se_r = b_width - c_x
+
+            # [distance_to_wall, function of the step along the ray to an (x, y) tile]
+            ray_steps = [
+                [y, lambda i: (x, y-i-1)],                                  # North
+                [min(c_x, c_y) - 1, lambda i: (x+i+1, y-i-1)],              # Northeast
+                [b_width - x - 1, lambda i: (x+i+1, y)],                    # East
+                [se_r, lambda i: (x+i+1, y+i+1)],                           # Southeast
+                [b_height - y - 1, lambda i: (x, y+i+1)],                   # South
+                [min(c_x, c_y) - 1, lambda i: (y-i-1, x+i+1)],              # Southwest
+                [x, lambda i: (x-i-1, y)],                                  # West
+                [nw_r, lambda i: (x-i-1, y-i-1)]                            # Northwest
+            ]
+
+            cell = y * b_width + x
+            for d, (r, tile) in enumerate(ray_steps):
+                walls[cell, d] = r
+                for i in range(r):
+                    t_x, t_y = tile(i)
+                    rays[cell, d, i] = t_y * b_width + t_x
+                    valid[cell, d, i] = True
+
+    return rays, valid, walls
+
+
+@lru_cache(maxsize=None)
+def step_tables(b_width, b_height):
+    """
+    NN:
+    Precompute the cell the head moves to from every cell, in each direction. Only done once per board size.
+    :return: Dict of a list per direction, NORTH, EAST, SOUTH, WEST, of the cell moved to from each cell, -1 where the
+             move leaves the board
+    """
+    tables = {}
+    for direction, (x_offset, y_offset) in moves.items():
+        tables[direction] = [
+            (y + y_offset) * b_width + x + x_offset if 0 <= x + x_offset < b_width and 0 <= y + y_offset < b_height
+            else -1
+            for y in range(b_height) for x in range(b_width)]
+    return tables
+
+
+@lru_cache(maxsize=None)
+def ray_lists(b_width, b_height):
+    """
+    NN:
+    The ray tables as python lists, which are quicker than arrays to loop over in Snake.look
+    :return: rays: the cells along each of the 8 rays for every cell, walls: distance to the wall + 1 along each ray
+    """
+    rays, valid, walls = ray_tables(b_width, b_height)
+    ray_cells = [[ray[:wall].tolist() for ray, wall in zip(cell_rays, cell_walls)]
+                 for cell_rays, cell_walls in zip(rays, walls)]
+
+    return ray_cells, (walls + 1).tolist()
+
+
+def look_along_rays(worlds, heads, b_width, b_height):
+    """
+    NN:
+    What the snakes of one or more games see, see Snake.look for what the values mean. Instead of walking each ray
+    until something is hit, every tile along every ray is fetched at once and the first fruit and snake part along
+    each ray are searched for.
+
+    :param worlds: The flattened worlds of the games, of the shape games x cells
+    :param heads: The cell of the head of each snake
+    :return: A (games, 24) array of what every snake can see
+    """
+    rays, valid, walls = ray_tables(b_width, b_height)
+    n = len(worlds)
+
+    heads_rays = rays[heads]
+    tiles = np.take_along_axis(worlds, heads_rays.reshape(n, -1), axis=1).reshape(heads_rays.shape)
+    tiles = np.where(valid[heads], tiles, 0)
+
+    # The first snake part along each ray, and the fruit if it's in front of that part
+    is_self = tiles == 1
+    is_fruit = tiles == 2
+    sees_self = is_self.any(axis=2)
+    sees_fruit = is_fruit.any(axis=2)
+    d_t_s = is_self.argmax(axis=2)
+    d_t_f = is_fruit.argmax(axis=2)
+    sees_fruit &= ~sees_self | (d_t_f < d_t_s)
+
+    # Zeros are reserved for no object found, when the snake is directly beside an object the distance is one
+    vision = np.empty((n, 8, 3), dtype=np.int64)
+    vision[:, :, 0] = walls[heads] + 1
+    vision[:, :, 1] = np.where(sees_fruit, d_t_f + 1, 0)
+    vision[:, :, 2] = np.where(sees_self, d_t_s + 1, 0)
+
+    return vision.reshape(n, 24)
+
+
+class FreeCells:
+    """
+    NN:
+    The cells of a world that the snake isn't on, in no particular order, and where every cell is in that list. A cell
+    is removed by moving the last cell into its place, so adding and removing a cell never has to search the list, and
+    a random free cell is a single draw from it. The fruit's cell is free, as the snake can move onto it.
+    """
+    def __init__(self, cells, index):
+        """
+        :param cells: The free cells, this list is kept and changed
+        :param index: A list of where every cell of the board is in cells, anything for the cells that aren't free
+        """
+        self.cells = cells
+        self.index = index
+
+    def __len__(self):
+        return len(self.cells)
+
+    def add(self, cell):
+        self.index[cell] = len(self.cells)
+        self.cells.append(cell)
+
+    def remove(self, cell):
+        # The last cell takes the place of the removed one
+        last = self.cells.pop()
+        if last != cell:
+            i = self.index[cell]
+            self.cells[i] = last
+            self.index[last] = i
+
+    def draw(self, rng):
+        """
+        :param rng: numpy Generator to draw from
+        :return: A random free cell, there has to be at least one
+        """
+        return self.cells[int(rng.integers(0, len(self.cells)))]
 
 
 class Snake:
-    def __init__(self, spawn_coord=(width//2, height//2), spawn_length=3, spawn_dir=NORTH, draw_snake=True):
+    def __init__(self, spawn_coord=(width//2, height//2), spawn_length=3, spawn_dir=NORTH, draw_snake=True,
+                 world=None, config=None, free=None):
         """
         :param spawn_coord: Where the snakes head should spawn when game is started
         :param spawn_length: Snakes starting length
+        :param world: The world of the game the snake is in, a new empty world is made if not given
+        :param free: FreeCells of the world without the spawned snake, worked out from the world if not given
+        :param config: GameConfig of the board the snake is on, default_config() if not given. The spawn is the one
+                       given to the snake, not the one of the config
         """
         # === Class variables === #
 
+        # NN:
+        # The board size and tilesize are the ones of the config
+        self.config = config if config is not None else default_config()
+        self.width, self.height, self.tilesize = self.config.width, self.config.height, self.config.tilesize
+        # Where the head ends up when moving in each direction, from every cell
+        self.steps = step_tables(self.width, self.height)
+
+        # NN:
+        # The snake marks itself in this world, which the fruits and look() then read from
+        self.world = world if world is not None else [0] * (self.width * self.height)
+
         self.length = spawn_length-1  # -1 to acount for the head
-        # self.pos is a list of all the coords of the snakes parts, and the direction they face, [[[X, Y], direction],]
-        self.pos = []
+        # self.pos is a deque of the cells of all the snakes parts, and self.directions of the direction they face
+        # The head is pushed onto the front and the tail popped off the back when moving, instead of shifting every part
+        self.pos = deque()
+        self.directions = deque()
+        # How many more moves the tail should stay in place for, the snake grows by one part per move
+        self.growing = 0
         # The direction the snake is moving in
         self.direction = spawn_dir
 
@@ -94,24 +391,28 @@ class Snake:
 
         # === Initial snake spawning === #
 
-        # Convert coords to usable pixel values
-        spawn_coord = [spawn_coord[0]*tilesize, spawn_coord[1]*tilesize]
-
-        # Head position, [[X, Y], direction]
-        self.pos.append([spawn_coord, spawn_dir])
-
         # Body parts offset from eachother according to the spawn_dir
-        x_offset = offsets[spawn_dir][0]
-        y_offset = offsets[spawn_dir][1]
+        x_offset, y_offset = moves[spawn_dir]
 
-        # Add coords and directions for the initial body parts
-        for i in range(self.length):
+        # Add the cells and directions of the head and the initial body parts
+        for i in range(self.length + 1):
             # The offsets are how much the snake should move when moving in that direction, so the body parts are placed
             # in the opposite direction of that. A north facing snake will have its parts placed south of the head.
-            self.pos.append([[spawn_coord[0]-x_offset*(i+1), spawn_coord[1]-y_offset*(i+1)], spawn_dir])
+            self.pos.append((spawn_coord[1] - y_offset*i) * self.width + spawn_coord[0] - x_offset*i)
+            self.directions.append(spawn_dir)
 
         self.update_world_coords()
 
+        # NN:
+        # The cells the snake isn't on, which the snake keeps up to date as it moves, and fruits are spawned on
+        if free is None:
+            cells = [cell for cell, tile in enumerate(self.world) if tile != 1]
+            index = [-1] * len(self.world)
+            for i, cell in enumerate(cells):
+                index[cell] = i
+            free = FreeCells(cells, index)
+        self.free = free
+
     def change_direction(self, direction):
         """
         Update the direction that the snake is moving, the snake will move in this direction until it is changed again.
@@ -128,51 +429,65 @@ class Snake:
 
     def draw(self):
         """
-        Draw sprites for every position in self.pos, note that this only draws the coords, without updating them.
+        Draw sprites for every part in self.pos, note that this only draws the parts, without updating them.
         :return:
         """
 
         # Draw all parts after the head
-        for part in self.pos[1:]:
-            board.blit(pg.transform.rotate(self.body_sprite, part[1]), part[0])
+        for cell, direction in islice(zip(self.pos, self.directions), 1, None):
+            board.blit(pg.transform.rotate(self.body_sprite, direction), cell_to_pixels(cell, self.width, self.tilesize))
 
         # Draw head last, as it it useful to draw it ontop of the body parts
-        board.blit(pg.transform.rotate(self.head_sprite, self.pos[0][1]), self.pos[0][0])
+        board.blit(pg.transform.rotate(self.head_sprite, self.directions[0]),
+                   cell_to_pixels(self.pos[0], self.width, self.tilesize))
 
     def move(self):
         """
-        Update the coordinates of all the snakes parts so that they may be drawn in a new place, simulating movement.
+        Update the cells of all the snakes parts so that they may be drawn in a new place, simulating movement.
         :return:
         """
 
-        # NN:
-        # Set coord of old tail to 0
-        world[self.pos[-1][0][1] // tilesize][self.pos[-1][0][0] // tilesize] = 0
-
-        # Start at the back, and set each parts coord and direction to the part in front of it's coord and direction.
-        for i, _ in enumerate(reversed(self.pos[1:])):
-            self.pos[-i-1] = self.pos[-i-2]
+        # Every part moves into the place of the part in front of it, which is the same as removing the tail and adding
+        # a new head. A growing snake keeps its tail, making it one part longer.
+        if self.growing:
+            self.growing -= 1
+        else:
+            # NN:
+            # Set cell of old tail to 0, it's free again
+            tail = self.pos.pop()
+            self.world[tail] = 0
+            self.free.add(tail)
+            self.directions.pop()
 
-        # Change head coord and direction according to self.direction, this is not done in the previous loop
-        drct = self.direction
-        self.pos[0] = [[self.pos[0][0][0] + offsets[drct][0], self.pos[0][0][1] + offsets[drct][1]], drct]
+        # The new head, moved from the old one according to self.direction, or -1 if it moved off the board. It is
+        # marked in the world by has_collided
+        self.pos.appendleft(self.steps[self.direction][self.pos[0]])
+        self.directions.appendleft(self.direction)
 
     def has_collided(self, fruit):
         """
-        After the snake has moved, check if the head collided with anything
+        After the snake has moved, check if the head collided with anything, and mark the head in the world.
+        The world holds the snake and fruit on every tile, so this doesn't need to look through the snakes parts.
+        :param fruit: The fruit in the world, it's found through the world though
         :return: 1: Player died, 2: Player hit the fruit, 3: Nothing collided
         """
-        pos = self.pos[0][0]
+        cell = self.pos[0]
 
-        # Snake's head is in the same position as another body part, meaning it has crashed
-        if pos in [part_pos[0] for part_pos in self.pos[1:]]:
+        # Snake's head is out of bounds
+        if cell < 0:
             return 1
 
-        # Snake's head is out of bounds
-        elif 0 > pos[0] or (width-1)*tilesize < pos[0] or 0 > pos[1] or (height-1)*tilesize < pos[1]:
+        tile = self.world[cell]
+
+        # Snake's head is in the same position as another body part, meaning it has crashed
+        if tile == 1:
             return 1
 
-        elif pos == fruit.corner_pos:
+        # The head now occupies the tile, this also replaces an eaten fruit
+        self.world[cell] = 1
+        self.free.remove(cell)
+
+        if tile == 2:
             self.grow()
             return 2
 
@@ -180,7 +495,7 @@ class Snake:
 
     def grow(self):
         self.length += 1
-        self.pos.append(self.pos[-1])  # Add a copy of the last body part
+        self.growing += 1  # The tail stays in place on the next move
 
     def update(self):
         """
@@ -200,207 +515,75 @@ class Snake:
         [[distance_to_wall, distance_to_fruit, distance_to_self], [d_t_w, d_t_f, d_t_s], ... ]
         becomes:
         [d_t_w, d_t_f, d_t_s, d_t_w, d_t_f, d_t_s, ... ]
-        The array is 'flattened'.
+        The array is 'flattened'. The directions are in the order N, NE, E, SE, S, SW, W, NW.
 
-        This is probably the most uneffecient function in this project, as this game was nor written with any sort of
-        raycasting in mind, and has no easy to use gameboard coord system.
+        Which tiles to check in each direction, and how far away the wall is, are looked up from the ray tables of the
+        board, see ray_tables. For a single snake walking the 8 short rays in python is faster than the numpy calls of
+        look_along_rays, which is used to look for many snakes at once.
 
         :return: An array of what the snake can see in each direction.
         """
-
-        # head_coord
-        h_c = [self.pos[0][0][0] // tilesize, self.pos[0][0][1] // tilesize]
-
-        # default distance, not sure what this should be for best results, worth tinkering with
-        d_d = -1
-        n_d_t_w, n_d_t_f, n_d_t_s = d_d, d_d, d_d
-        e_d_t_w, e_d_t_f, e_d_t_s = d_d, d_d, d_d
-        s_d_t_w, s_d_t_f, s_d_t_s = d_d, d_d, d_d
-        w_d_t_w, w_d_t_f, w_d_t_s = d_d, d_d, d_d
-
-        # Check north
-        # n_d_t_w : north_distance_to_wall
-        n_d_t_w = h_c[1]
-        for i, row in enumerate(reversed(world[:h_c[1]])):
-            if row[h_c[0]] == 2:  # Check the tile on the row that aligns with the heads x coordinate for fruit
-                n_d_t_f = i
-
-            if row[h_c[0]] == 1:  # Check for snake
-                n_d_t_s = i
-                break
-
-        # Check south
-        s_d_t_w = height - h_c[1] - 1
-        for i, row in enumerate(world[h_c[1]+1:]):
-            if row[h_c[0]] == 2:  # Check the tile on the row that aligns with the heads x coordinate
-                s_d_t_f = i
-
-            if row[h_c[0]] == 1:  # Check for snake
-                s_d_t_s = i
-                break
-
-        # Check east
-        e_d_t_w = width - h_c[0] - 1
-        # Check along the row that the snake is on, starting at the head
-        for i, tile in enumerate(world[h_c[1]][h_c[0]+1:]):
-            if tile == 2:  # Check for fruit
-                e_d_t_f = i
-
-            if tile == 1:  # Check for snake
-                e_d_t_s = i
-                break
-
-        # Check west
-        w_d_t_w = h_c[0]
-        # Check along the row that the snake is on, starting at the head
-        for i, tile in enumerate(reversed(world[h_c[1]][:h_c[0]])):
-            if tile == 2:  # Check for fruit
-                w_d_t_f = i
-
-            if tile == 1:  # Check for snake
-                w_d_t_s = i
-                break
-
-        ne_d_t_w, ne_d_t_f, ne_d_t_s = d_d, d_d, d_d
-        nw_d_t_w, nw_d_t_f, nw_d_t_s = d_d, d_d, d_d
-        se_d_t_w, se_d_t_f, se_d_t_s = d_d, d_d, d_d
-        sw_d_t_w, sw_d_t_f, sw_d_t_s = d_d, d_d, d_d
-
-        # Convectional x and y, with 0, 0 in the bootom left
-        c_x = h_c[1] + 1
-        c_y = height - h_c[0]
-
-        # Northeast
-        # r is the distance to the edge northeast, this took a while to get right
-        r = -1
-        if c_x == c_y:
-            r = c_x - 1
-        elif c_x < c_y:
-            r = c_x - 1
-        elif c_x > c_y:
-            r = c_y - 1
-
-        ne_d_t_w = r
-        for i in range(r):
-            tile = world[h_c[1]-i-1][h_c[0]+i+1]
-            if tile == 2:
-                ne_d_t_f = i
-            if tile == 1:
-                ne_d_t_s = i
-                break
-
-        # Southwest
-        r = -1
-        if c_x == c_y:
-            r = c_x - 1
-        elif c_x < c_y:
-            r = c_x - 1
-        elif c_x > c_y:
-            r = c_y - 1
-
-        sw_d_t_w = r
-        for i in range(r):
-            tile = world[h_c[0]+i+1][h_c[1]-i-1]
-            if tile == 2:
-                sw_d_t_f = i
-            if tile == 1:
-                sw_d_t_s = i
-                break
-
-        # Northwest
-        r = -1
-        if (c_x + c_y) == (width + 1):
-            r = c_x - 1
-        elif (c_x + c_y) < (width + 1):
-            r = c_x - 1
-        elif (c_x + c_y) > (width + 1):
-            r = height - c_y
-
-        nw_d_t_w = r
-        for i in range(r):
-            tile = world[h_c[1]-i-1][h_c[0]-i-1]
-            if tile == 2:
-                nw_d_t_f = i
-            if tile == 1:
-                nw_d_t_s = i
-                break
-
-        # Southeast
-        r = -1
-        if (c_x + c_y) == (width + 1):
-            r = width - c_x
-        elif (c_x + c_y) < (width + 1):
-            r = c_y - 1
-        elif (c_x + c_y) > (width + 1):
-            r = width - c_x
-
-        se_d_t_w = r
-        for i in range(r):
-            tile = world[h_c[1]+i+1][h_c[0]+i+1]
-            if tile == 2:
-                se_d_t_f = i
-            if tile == 1:
-                se_d_t_s = i
-                break
-
-        vision_array = [
-            n_d_t_w, n_d_t_f, n_d_t_s,  # yes, no, no flipped?
-            ne_d_t_w, ne_d_t_f, ne_d_t_s,  #
-            e_d_t_w, e_d_t_f, e_d_t_s,
-            se_d_t_w, se_d_t_f, se_d_t_s,
-            s_d_t_w, s_d_t_f, s_d_t_s,
-            sw_d_t_w, sw_d_t_f, sw_d_t_s,
-            w_d_t_w, w_d_t_f, w_d_t_s,
-            nw_d_t_w, nw_d_t_f, nw_d_t_s
-        ]
-
-        # Zeros are reserved for no object found, when the snake is directly beside an object the distance is one
-        for i, _ in enumerate(vision_array):
-            vision_array[i] += 1
-
-        sum_visions = sum(vision_array)
-        # Normalize array, not used anymore
-        # norm_vision_array = list([float(i)/sum_visions for i in vision_array])
+        rays, walls = ray_lists(self.width, self.height)
+        cell = self.pos[0]
+        world = self.world
+
+        vision_array = []
+        for ray, d_t_w in zip(rays[cell], walls[cell]):
+            # Zeros are reserved for no object found, when the snake is directly beside an object the distance is one
+            d_t_f, d_t_s = 0, 0
+            for i, tile_cell in enumerate(ray, 1):
+                tile = world[tile_cell]
+                if tile == 2:  # Check for fruit
+                    d_t_f = i
+                elif tile == 1:  # Check for snake
+                    d_t_s = i
+                    break
+            vision_array += (d_t_w, d_t_f, d_t_s)
 
         return vision_array
 
     def update_world_coords(self):
         # NN:
-        # Add all the coords in self.pos to world coords, don't really know why I didn't just do this with the game.
-        for p in self.pos:
-            world[p[0][1] // tilesize][p[0][0] // tilesize] = 1
+        # Add all the cells in self.pos to the world, don't really know why I didn't just do this with the game.
+        for cell in self.pos:
+            self.world[cell] = 1
 
 
 class Fruit:
     # Todo: Add support for multiple fruits (rewrite class)
-    def __init__(self, avoid_snake: Snake):
+    def __init__(self, avoid_snake: Snake, rng=None):
         """
         Generate a fruit on a random tile that the snake is not currently occupying
-        :param avoid_snake: the snake to avoid
+        :param avoid_snake: the snake to avoid, it can't fill the whole board, see SnakeGame.step
+        :param rng: numpy Generator to draw the spawn from, a new unseeded one is used if not given
         """
-        impossible_spawns = []
-        spawn_pos = []
-
-        # Add all the snakes current positions to the impossible spawns list
-        # This could be made into one massive inline loop, but this is more readable
-        for xy in [pos[0] for pos in avoid_snake.pos]:
-            impossible_spawns.append(xy)
+        # NN:
+        # A seeded generator makes the fruit spawns, and thereby the whole game, reproducible
+        if rng is None:
+            rng = np.random.default_rng()
 
-        # I could have made a large array of possible_spawns, but it turns out this is faster
-        # Check if spawn_pos is impossible or nonexistant, if it is, generate a new one.
-        while spawn_pos in impossible_spawns or not spawn_pos:
-            spawn_pos = [randrange(0, width)*tilesize, randrange(0, height)*tilesize]
+        # NN:
+        # The snake keeps track of the cells it isn't on, so this is one draw instead of retrying until one is free
+        cell = avoid_snake.free.draw(rng)
 
-        self.corner_pos = spawn_pos
-        self.pos = [spawn_pos[0]+tilesize//2, spawn_pos[1]+tilesize//2]  # Center of tile
+        self.cell = cell
+        self.width, self.tilesize = avoid_snake.width, avoid_snake.tilesize
 
         # NN:
-        # Add the fruits coord to world coords
-        world[spawn_pos[1] // tilesize][spawn_pos[0] // tilesize] = 2
+        # Add the fruit to the world of the snake's game
+        avoid_snake.world[cell] = 2
 
     def draw(self):
-        # The fruit
-        pg.draw.circle(board, red, self.pos, tilesize//2-2)
+        # The fruit, in the center of its tile
+        corner = cell_to_pixels(self.cell, self.width, self.tilesize)
+        pg.draw.circle(board, red, (corner[0] + self.tilesize//2, corner[1] + self.tilesize//2), self.tilesize//2-2)
+
+
+def cell_to_pixels(cell, b_width, b_tilesize):
+    """
+    :return: The position in pixels of the top left corner of a cell
+    """
+    return cell % b_width * b_tilesize, cell // b_width * b_tilesize
 
 
 class CheckerBoard:
@@ -449,16 +632,16 @@ def game_over(score):
     while True:
         # Check for use input
         for ev in pg.event.get():  # ev : event
-            if ev.type == QUIT:
+            if ev.type == pg.QUIT:
                 pg.quit()
                 kill_everything()
 
-            elif ev.type == KEYDOWN:
+            elif ev.type == pg.KEYDOWN:
                 k = ev.key
-                if k == K_ESCAPE:
+                if k == pg.K_ESCAPE:
                     pg.quit()
                     kill_everything()
-                elif k == K_SPACE:
+                elif k == pg.K_SPACE:
                     cont = True
                     break
             break
@@ -475,8 +658,8 @@ def game_over(score):
 # Helper class to spawn when not using fruits, easier to do this than to modify the other classes
 class FakeFruit:
     def __init__(self):
-        # Used by the Snakes collision check
-        self.corner_pos = 0
+        # Not on any cell of the board
+        self.cell = -1
 
     # Called when updating GUI
     def draw(self):
@@ -486,43 +669,83 @@ class FakeFruit:
 # NN:
 # Used for the nerual network, the game is still playable without this class.
 class SnakeGame:
-    def __init__(self, draw_gui, fruits=True):
+    def __init__(self, draw_gui, fruits=True, seed=None, config=None, detect_loops=None):
         """
-        I decided to just use all the global variables instead of parsing them here again to save time
+        :param seed: Seed, SeedSequence or numpy Generator for the fruit spawns, games with the same seed and inputs play
+                     out identically
+        :param config: GameConfig of the game, default_config() if not given
+        :param detect_loops: Whether to end the game when the snake loops, see has_looped, default_detect_loops if not
+                             given
         """
+        if detect_loops is None:
+            detect_loops = default_detect_loops
+        if config is None:
+            config = default_config()
+        self.config = config
+
         # Start pygame
         if draw_gui:
-            init_pg()
+            init_pg(config)
         self.draw_gui = draw_gui
 
-        global world
-        # Reset world
-        world = np.zeros((width, height))
+        # NN:
+        # This game's own world, shared with its snake and fruits
+        self.world = [0] * (config.width * config.height)
 
         # How many fruits the snake has eaten
         self.score = 0
 
+        # Every fruit of this game is drawn from this generator
+        self.rng = np.random.default_rng(seed)
+
         # The snake (:
-        self.snake = Snake(spawn_coord=snake_spawn_coord,
-                           spawn_length=snake_spawn_length,
-                           spawn_dir=snake_spawn_direction,
-                           draw_snake=draw_gui)
+        # Its free cells are copied from the ones of the config, instead of being worked out from the world every game
+        _, free, free_index = spawn_layout(config)
+        self.snake = Snake(spawn_coord=config.snake_spawn_coord,
+                           spawn_length=config.snake_spawn_length,
+                           spawn_dir=config.snake_spawn_direction,
+                           draw_snake=draw_gui,
+                           world=self.world,
+                           config=config,
+                           free=FreeCells(free.tolist(), free_index.tolist()))
 
         # Generate the first fruit, if fruits is true, else spawn a FakeFruit that won't interfere with the snake
-        self.fruit = Fruit(avoid_snake=self.snake) if fruits else FakeFruit()
+        self.fruit = Fruit(avoid_snake=self.snake, rng=self.rng) if fruits else FakeFruit()
 
         # The gameboard
-        self.checker_board = CheckerBoard(b_width=width, b_height=height, b_tilesize=tilesize)
+        self.checker_board = CheckerBoard(b_width=config.width, b_height=config.height, b_tilesize=config.tilesize)
 
         self.score = 0
         self.age = 0
 
         # If the snake has not found a fruit by max_steps, it dies
-        self.steps_left = max_steps
+        self.steps_left = config.max_steps
 
         self.last_dir = 0
         self.changes = 0
 
+        # Why the game ended, one of terminations
+        self.termination = None
+
+        # Every state the snake has been in since it last ate, see has_looped
+        self.seen_states = set() if detect_loops else None
+
+    def has_looped(self):
+        """
+        NN:
+        Check if the snake has been in this exact state before, since it last ate. The NN only sees the world, which
+        doesn't change between fruits other than the snake, so a snake that is back in a state will keep going around
+        the same loop until it starves.
+        :return: True if the state has been seen before
+        """
+        snake = self.snake
+        state = (snake.direction, snake.growing, tuple(snake.pos))
+
+        if state in self.seen_states:
+            return True
+        self.seen_states.add(state)
+        return False
+
     def step(self, direction):
         """
         This is the function that would normally be called once a frame, but in our case we want it to be called as
@@ -556,20 +779,25 @@ class SnakeGame:
 
         if collided == 1 or self.steps_left == 0:
             # The snake is dead, return the score and age for the NN to use as fitness
+            self.termination = "collided" if collided == 1 else "starved"
             return self.score, self.age
 
         elif collided == 2:
-            # Snake ate a fruit
-            # NN:
-            # Change old fruit's coord in world to be a snake
-            world[self.fruit.corner_pos[1] // tilesize][self.fruit.corner_pos[0] // tilesize] = 1
-            self.fruit = Fruit(self.snake)
+            # Snake ate a fruit, the snake has already taken its place in the world
             self.score += 1
+            if not self.snake.free:
+                # The snake fills the whole board, there's nowhere left for a fruit so it has won
+                self.termination = "won"
+                self.age += 1
+                return self.score, self.age
+            self.fruit = Fruit(self.snake, self.rng)
             # Reset the step counter
-            self.steps_left = max_steps
+            self.steps_left = self.config.max_steps
+            # The world changed, so the old states can't happen again
+            if self.seen_states is not None:
+                self.seen_states.clear()
 
-        # Snake survived
-        self.snake.update_world_coords()
+        # Snake survived, the world was kept up to date by the snakes move and collision check
 
         if self.draw_gui:
             # Update the display, not needed for the NN, but fun to look at, probably slows it down a ton though
@@ -580,6 +808,13 @@ class SnakeGame:
         # The age of this game/snake increases by one every step
         self.age += 1
 
+        # The snake would go around in this loop until it starves, at the age it would have starved at
+        if self.seen_states is not None and self.has_looped():
+            self.termination = "looped"
+            self.age += self.steps_left
+            self.steps_left = 0
+            return self.score, self.age
+
         # return False when the snake survived the step/frame
         return False
 
@@ -589,10 +824,13 @@ def main():
     score = 0
 
     # The snake (:
-    snake = Snake(spawn_coord=[2, 3], spawn_length=snake_spawn_length, spawn_dir=snake_spawn_direction)
+    snake = Snake(spawn_coord=snake_spawn_coord, spawn_length=snake_spawn_length, spawn_dir=snake_spawn_direction)
+
+    # Every fruit is drawn from this generator
+    rng = np.random.default_rng()
 
     # Generate the first fruit
-    fruit = Fruit(avoid_snake=snake)
+    fruit = Fruit(avoid_snake=snake, rng=rng)
 
     # The gameboard
     checker_board = CheckerBoard(b_width=width, b_height=height, b_tilesize=tilesize)
@@ -601,20 +839,20 @@ def main():
     while True:
 
         for ev in pg.event.get():  # ev : event
-            if ev.type == QUIT:
+            if ev.type == pg.QUIT:
                 pg.quit()
                 kill_everything()
 
-            elif ev.type == KEYDOWN:
+            elif ev.type == pg.KEYDOWN:
                 k = ev.key
                 # Could use a for loop, but this is more readable
-                if k == K_UP or k == k_up_a:
+                if k == pg.K_UP or k == k_up_a:
                     snake.change_direction(NORTH)
-                elif k == K_RIGHT or k == k_right_a:
+                elif k == pg.K_RIGHT or k == k_right_a:
                     snake.change_direction(EAST)
-                elif k == K_DOWN or k == k_down_a:
+                elif k == pg.K_DOWN or k == k_down_a:
                     snake.change_direction(SOUTH)
-                elif k == K_LEFT or k == k_left_a:
+                elif k == pg.K_LEFT or k == k_left_a:
                     snake.change_direction(WEST)
                 # Limit user to one keypress per frame, this has the drawback that pressing two keys in succession fast
                 # enough will only register the first key if both are pressed during the same frame, without the break
@@ -634,12 +872,21 @@ def main():
             snake = Snake(spawn_coord=snake_spawn_coord,
                           spawn_length=snake_spawn_length,
                           spawn_dir=snake_spawn_direction)
+            # The new snake has a new world, so the fruit has to be placed in it
+            fruit = Fruit(snake, rng)
             score = 0
         elif collided == 2:
             # Snake ate a fruit
-            # Make a new fruit
-            fruit = Fruit(snake)
             score += 1
+            if not snake.free:
+                # The snake fills the whole board, the player has won
+                game_over(score)
+                snake = Snake(spawn_coord=snake_spawn_coord,
+                              spawn_length=snake_spawn_length,
+                              spawn_dir=snake_spawn_direction)
+                score = 0
+            # Make a new fruit
+            fruit = Fruit(snake, rng)
 
         # Update the display
         pg.display.flip()
@@ -652,27 +899,33 @@ def manaul_mode():
 
     while True:
         for ev in pg.event.get():  # ev : event
-            if ev.type == KEYDOWN:
+            if ev.type == pg.KEYDOWN:
                 k = ev.key
-                if k == K_UP or k == k_up_a:
+                if k == pg.K_UP or k == k_up_a:
                     game.step(0)
-                elif k == K_RIGHT or k == k_right_a:
+                elif k == pg.K_RIGHT or k == k_right_a:
                     game.step(1)
-                elif k == K_DOWN or k == k_down_a:
+                elif k == pg.K_DOWN or k == k_down_a:
                     game.step(2)
-                elif k == K_LEFT or k == k_left_a:
+                elif k == pg.K_LEFT or k == k_left_a:
                     game.step(3)
                 print("o:", str(list([str(d).rjust(5) for d in game.snake.look()])).replace("'", ""))
 
 
-def init_pg():
-    global board, clock
-    # Init pygame
+def init_pg(config=None):
+    """
+    :param config: GameConfig of the game to show, default_config() if not given
+    """
+    global pg, board, clock
+    if config is None:
+        config = default_config()
+    # Init pygame, this is the only place that imports it
+    import pygame as pg
     pg.init()
     clock = pg.time.Clock()
 
     # The board that the entire game plays out on
-    board = pg.display.set_mode((width * tilesize, height * tilesize))
+    board = pg.display.set_mode((config.width * config.tilesize, config.height * config.tilesize))
     pg.display.set_caption("Snake!")
     pg.display.flip()
 
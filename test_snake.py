@@ -1,12 +1,23 @@
-import pickle
+import brain_file
+from neural_network import SnakeBrain
 
 # Run this to test the currently saved fittest snake
 
-snakenum = 749
+snakenum = 545
 
-with open("Test copy/fittest_snake_" + str(snakenum) + ".pickle", "rb") as file:
-        snake = pickle.load(file)
-        print(snake["snake_settings"])
+path = "Test copy/fittest_snake_" + str(snakenum) + ".brain"
+header = brain_file.read_header(path)[0]
+metadata = header["metadata"]
+print(metadata.get("snake_settings", header["game"]))
 
-        while True:
-            print(snake["snake"].play(True, 0.1, snake["n_fruits"]))
+# Play on the board the snake was evolved on. The game only has one fruit at a time, so snakes that were evolved with
+# more, ie. the ones with n_fruits in Test copy, aren't replaying the exact game they were evolved in
+config = brain_file.game_config(header)
+n_fruits = metadata.get("n_fruits", int(metadata.get("fruits", True)))
+if n_fruits > 1:
+    print("Warning: this snake was evolved with {} fruits at a time, it's replayed with one".format(n_fruits))
+fruits = bool(n_fruits)
+
+snake = SnakeBrain.load(path)
+while True:
+        print(snake.play(True, 0.1, fruits, config=config))